@@ -17,24 +17,28 @@ class Diagnostic(Exception):
         self.location = location
         self.kind = kind
 
+    def __reduce__(self):
+        # Exception默认用args进行序列化, 而这里没有设置args
+        return (Diagnostic, (self.msg, self.location, self.kind))
+
     def dump(self):
         """输出信息"""
+        # 批处理时在工作进程中输出到字符串, 没有colorama的autoreset, 需要自己恢复颜色
         if self.kind == DiagnosticKind.ERROR:
-            print(Fore.RED + "错误", end=": ")
+            print(Fore.RED + "错误" + Fore.RESET, end=": ")
         elif self.kind == DiagnosticKind.WARNING:
-            print(Fore.YELLOW + "警告", end=": ")
+            print(Fore.YELLOW + "警告" + Fore.RESET, end=": ")
         print(self.msg)
         indent = " " * 4
         for loc in self.location:
-            filename = loc["filename"]
-            lines = Location.lines[filename]
-            row = loc["lineno"] - 1
+            source = Location.files[Location.file_ids[loc["filename"]]]
+            line = source.line(loc["lineno"])
             col = loc["col"] - 1
-            if row >= len(lines):
+            if not line:
                 continue
             prefix = indent * 2 + f"{loc['lineno']}|"
             print(indent + f"{self.location}:")
-            print(prefix, lines[row].rstrip())
+            print(prefix, line.rstrip())
             print(" " * len(prefix), " " * col + "^" * loc["span_col"])
 
 
@@ -42,11 +46,17 @@ class Error(Diagnostic):
     def __init__(self, msg: str, location: Location):
         super().__init__(msg, location, DiagnosticKind.ERROR)
 
+    def __reduce__(self):
+        return (Error, (self.msg, self.location))
+
 
 class Diagnostics(Exception):
     def __init__(self, diagnostic_list: list[Error]):
         self.list = diagnostic_list
 
+    def __reduce__(self):
+        return (Diagnostics, (self.list,))
+
     def __add__(self, other: Union[list[Diagnostic], "Diagnostics"]):
         diagnostic_list = self.list
         if isinstance(other, Diagnostics):
@@ -1,53 +1,40 @@
-from Basic.Location import Location
+from Basic.Location import Location, SourceFile
 from Basic.Diagnostic import Error
 
 
 class FileReader:
     """文件读取器"""
 
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, text: str = None):
         self.filename = filename
-        try:
-            self.lines = open(filename, encoding="utf-8").readlines()
-        except FileNotFoundError:
-            raise Error(f"无法打开文件: {filename}", Location())
-        self.row = 0  # 从0开始
-        self.col = 0  # 从0开始
-        self.hasread: list[tuple[str, Location]] = []  # 已经读到的字符
-        self.nextindex = 0
-        if self.filename not in Location.lines:
-            Location.lines[self.filename] = self.lines
+        if text != None:  # 使用给定的内容, 例如编辑器中尚未保存的文件
+            self.source = SourceFile(filename, text)
+        else:
+            try:
+                self.source = SourceFile.open(filename)
+            except FileNotFoundError:
+                raise Error(f"无法打开文件: {filename}", Location())
+        self.text = self.source.text  # 文件的全部内容
+        self.file_id = Location.register(self.source)
+        self.offset = 0  # 下一个字符的偏移
+
+    def location(self, offset: int) -> Location:
+        """返回偏移处字符对应的片段"""
+        return Location(self.file_id, offset, offset + 1)
+
+    def span(self, begin: int, end: int) -> Location:
+        """返回text[begin:end]对应的片段"""
+        return Location(self.file_id, begin, end)
 
     def current(self) -> tuple[str, Location]:
-        return self.hasread[self.nextindex - 1]
+        return self.text[self.offset - 1 : self.offset], self.location(self.offset - 1)
 
     def next(self) -> tuple[str, Location]:
         """读取一个字符, 并返回这个字符和它对应的片段"""
-        if self.nextindex >= len(self.hasread):
-            location = Location(
-                [
-                    {
-                        "filename": self.filename,
-                        "lineno": self.row + 1,
-                        "col": self.col + 1,
-                        "span_col": 1,
-                    }
-                ]
-            )
-            # self.row和self.col永远指向下一个字符位置
-            if self.row >= len(self.lines):  # 文件结束
-                self.hasread.append(("", location))
-            else:
-                ch = self.lines[self.row][self.col]
-                self.col += 1
-                if self.col >= len(self.lines[self.row]):
-                    self.row += 1
-                    self.col = 0
-                self.hasread.append((ch, location))
-        ch, location = self.hasread[self.nextindex]
-        self.nextindex += 1
-        return ch, location
+        offset = self.offset
+        self.offset += 1
+        return self.text[offset : offset + 1], self.location(offset)
 
     def back(self):
         """回退当前已经读到的字符, 使下一次读取时重新读到这个字符"""
-        self.nextindex -= 1
+        self.offset -= 1
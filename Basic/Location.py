@@ -1,4 +1,9 @@
-from typing import Iterable, TypedDict
+import os
+from array import array
+from bisect import bisect_right
+from typing import Iterator, TypedDict
+
+from Basic.SourceCache import SourceCache, compute_line_starts
 
 
 class LocationDict(TypedDict):
@@ -8,40 +13,203 @@ class LocationDict(TypedDict):
     span_col: int  # 跨越的列
 
 
-class Location(list[LocationDict]):
-    lines: dict[str, list[str]] = {}  # 各个文件的每行内容
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.merge()
-
-    def append(self, object: LocationDict) -> None:
-        super().append(object)
-        self.merge()
-
-    def extend(self, iterable: Iterable[LocationDict]) -> None:
-        super().extend(iterable)
-        self.merge()
-
-    def merge(self):
-        self.sort(key=lambda a: (a["filename"], a["lineno"], a["col"], a["span_col"]))
-        i = 0
-        while i < len(self) - 1:
-            if (  # 有交集
-                self[i]["filename"] == self[i + 1]["filename"]
-                and self[i]["lineno"] == self[i + 1]["lineno"]
-                and self[i]["col"] <= self[i + 1]["col"] + self[i + 1]["span_col"]
-                and self[i]["col"] + self[i]["span_col"] >= self[i + 1]["col"]
-            ):
-                self[i]["span_col"] = (
-                    max(
-                        self[i]["col"] + self[i]["span_col"],
-                        self[i + 1]["col"] + self[i + 1]["span_col"],
-                    )
-                    - self[i]["col"]
-                )
-                self.pop(i + 1)
-            i += 1
+class SourceFile:
+    """源文件的内容以及每行开头的偏移
+
+    内容总是由该对象持有, 即使文件之后被修改, 删除或者从SourceCache中淘汰,
+    位置也按照进行词法分析时的内容计算行列.
+    从磁盘打开的文件与SourceCache共享同一个字符串, 内容不变时不会重复占用内存
+    """
+
+    __slots__ = ("filename", "realpath", "_text", "_line_starts")
+
+    def __init__(
+        self,
+        filename: str,
+        text: str,
+        realpath: str = None,
+        line_starts: array = None,
+    ):
+        self.filename = filename
+        self.realpath = realpath  # 文件的真实路径, 不是从磁盘打开的文件为None
+        self._text = text
+        self._line_starts = line_starts  # 为None时第一次用到才计算
+
+    @staticmethod
+    def open(filename: str) -> "SourceFile":
+        """通过SourceCache打开文件, 文件被修改过时重新读取"""
+        realpath = os.path.realpath(filename)
+        _, text, line_starts = SourceCache.get(realpath, check=True)
+        return SourceFile(filename, text, realpath, line_starts)
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @property
+    def line_starts(self) -> array:
+        """每行开头的偏移"""
+        if self._line_starts == None:
+            self._line_starts = compute_line_starts(self._text)
+        return self._line_starts
+
+    def __reduce__(self):
+        return (SourceFile.load, (self.filename, self.text))
+
+    @staticmethod
+    def load(filename: str, text: str) -> "SourceFile":
+        """用于反序列化, 已经登记了内容相同的源文件时直接返回它
+
+        这样之后登记每个位置时不用再比较一次内容
+        """
+        file_id = Location.file_ids.get(filename)
+        if file_id != None and Location.files[file_id].text == text:
+            return Location.files[file_id]
+        return SourceFile(filename, text)
+
+    def linecol(self, offset: int) -> tuple[int, int]:
+        """返回偏移对应的行和列(从1开始)"""
+        line_starts = self.line_starts
+        if offset >= len(self.text):  # 文件结束
+            return len(line_starts) + 1, 1
+        row = bisect_right(line_starts, offset) - 1
+        return row + 1, offset - line_starts[row] + 1
+
+    def line_end(self, lineno: int) -> int:
+        """返回第lineno行(包括换行符)结尾的偏移"""
+        line_starts = self.line_starts
+        if lineno < len(line_starts):
+            return line_starts[lineno]
+        return len(self.text)
+
+    def line(self, lineno: int) -> str:
+        """返回第lineno行的内容, 不存在时返回空字符串"""
+        line_starts = self.line_starts
+        if lineno > len(line_starts):
+            return ""
+        return self.text[line_starts[lineno - 1] : self.line_end(lineno)]
+
+
+class Location:
+    """代码中连续的一段, 由文件编号和起止偏移表示
+
+    创建后不再修改(只有增量分析会在文本被编辑后原地移动它), 合并时总是返回新的对象,
+    因此可以在token之间直接共享
+    """
+
+    __slots__ = ("file_id", "begin", "end")
+
+    files: list[SourceFile] = []  # 文件编号对应的源文件
+    file_ids: dict[str, int] = {}  # 文件名对应的文件编号
+
+    def __init__(self, file_id: int = -1, begin: int = 0, end: int = 0):
+        self.file_id = file_id  # 为-1时表示没有位置
+        self.begin = begin
+        self.end = end
+
+    @staticmethod
+    def register(source: SourceFile) -> int:
+        """登记源文件并返回它的文件编号"""
+        file_id = Location.file_ids.get(source.filename)
+        if file_id != None:
+            registered = Location.files[file_id]
+            # 同一文件打开多次时内容是SourceCache中的同一个字符串, 比较很快
+            if registered is source or registered.text == source.text:
+                return file_id
+        file_id = len(Location.files)
+        Location.files.append(source)
+        Location.file_ids[source.filename] = file_id
+        return file_id
+
+    @staticmethod
+    def release(mark: int):
+        """注销编号不小于mark的源文件, mark为之前的len(Location.files)
+
+        源文件持有全部内容, 批处理时每个文件处理完之后注销它用到的源文件,
+        内容才能随SourceCache的淘汰被释放. 之后不能再使用这些文件中的位置
+        """
+        del Location.files[mark:]
+        Location.file_ids.clear()
+        for file_id, source in enumerate(Location.files):
+            Location.file_ids[source.filename] = file_id
+
+    @staticmethod
+    def from_source(source: SourceFile, begin: int, end: int) -> "Location":
+        """用源文件而不是文件编号创建位置, 用于反序列化"""
+        return Location(Location.register(source), begin, end)
+
+    def __reduce__(self):
+        # 文件编号只在当前进程中有效, 因此序列化时保存源文件本身
+        if self.file_id == -1:
+            return (Location, ())
+        return (Location.from_source, (Location.files[self.file_id], self.begin, self.end))
+
+    def spans(self) -> tuple["Location", ...]:
+        """组成该位置的各个连续片段"""
+        return (self,) if self.file_id != -1 else ()
+
+    def __add__(self, other: "Location") -> "Location":
+        if (
+            isinstance(other, Location)
+            and self.file_id == other.file_id != -1
+            and other.begin <= self.end
+            and self.begin <= other.end
+        ):  # 有交集或者相邻
+            return Location(
+                self.file_id, min(self.begin, other.begin), max(self.end, other.end)
+            )
+        return merge_spans(self.spans() + other.spans())
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def key(self) -> tuple[tuple[int, int, int], ...]:
+        """用于比较和哈希的值"""
+        return tuple((span.file_id, span.begin, span.end) for span in self.spans())
+
+    def __eq__(self, other):
+        return isinstance(other, Location) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return f"Location({self.file_id},{self.begin},{self.end})"
+
+    @property
+    def lineno(self) -> int:
+        """开头所在的行"""
+        for loc in self:
+            return loc["lineno"]
+        return 0
+
+    @property
+    def col(self) -> int:
+        """开头所在的列"""
+        for loc in self:
+            return loc["col"]
+        return 0
+
+    def __iter__(self) -> Iterator[LocationDict]:
+        """按行拆分, 依次产生每一行中对应的部分"""
+        for span in self.spans():
+            source = Location.files[span.file_id]
+            begin = span.begin
+            while True:
+                lineno, col = source.linecol(begin)
+                line_end = source.line_end(lineno)
+                yield {
+                    "filename": source.filename,
+                    "lineno": lineno,
+                    "col": col,
+                    "span_col": max(min(span.end, line_end) - begin, 1),
+                }
+                if span.end <= line_end or line_end >= len(source.text):
+                    break
+                begin = line_end
 
     def __str__(self):
         s = []
@@ -52,3 +220,41 @@ class Location(list[LocationDict]):
                 s.append(cur_filename + ":")
             s[-1] += f'({loc["lineno"]},{loc["col"]},{loc["span_col"]})'
         return f"<{';'.join(s)}>"
+
+
+class MultiLocation(Location):
+    """由多段不相连的片段组成的位置, 例如宏展开得到的token"""
+
+    __slots__ = ("span_list",)
+
+    def __init__(self, span_list: tuple[Location, ...]):
+        super().__init__()
+        self.span_list = span_list
+
+    def __reduce__(self):
+        return (MultiLocation, (self.span_list,))
+
+    def spans(self) -> tuple[Location, ...]:
+        return self.span_list
+
+    def __repr__(self):
+        return f"MultiLocation({self.span_list})"
+
+
+def merge_spans(spans: tuple[Location, ...]) -> Location:
+    """将片段排序并合并有交集或者相邻的部分"""
+    spans = sorted(
+        spans, key=lambda a: (Location.files[a.file_id].filename, a.begin, a.end)
+    )
+    merged: list[Location] = []
+    for span in spans:
+        last = merged[-1] if merged else None
+        if last != None and last.file_id == span.file_id and span.begin <= last.end:
+            merged[-1] = Location(last.file_id, last.begin, max(last.end, span.end))
+        else:
+            merged.append(span)
+    if not merged:
+        return Location()
+    if len(merged) == 1:
+        return merged[0]
+    return MultiLocation(tuple(merged))
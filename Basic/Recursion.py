@@ -0,0 +1,81 @@
+import sys
+import threading
+from functools import wraps
+
+stack_size = 1024 * 1024 * 1024  # 运行被装饰的函数的线程的栈大小(字节), 只占用虚拟内存
+recursion_limit = 10**7  # 运行被装饰的函数时的最大递归深度
+local = threading.local()
+# 最大递归深度和线程栈大小是整个进程的设置, 多个线程同时调用被装饰的函数时,
+# 由最先开始的调用提高最大递归深度, 由最后结束的调用恢复
+lock = threading.Lock()
+active = 0  # 正在运行的大栈线程数
+saved_limit = 0  # 第一个大栈线程开始之前的最大递归深度
+
+
+def acquire():
+    global active, saved_limit
+    if active == 0:
+        saved_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(saved_limit, recursion_limit))
+    active += 1
+
+
+def release():
+    global active
+    active -= 1
+    if active == 0:
+        sys.setrecursionlimit(saved_limit)
+
+
+def start_thread(run) -> threading.Thread:
+    """用大栈启动线程, 无法分配栈时抛出RuntimeError或者ValueError"""
+    old_size = threading.stack_size(stack_size)
+    try:
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+    finally:
+        threading.stack_size(old_size)
+    return thread
+
+
+def deep_recursion(func):
+    """
+    被装饰的函数在栈足够大的线程中运行, 同时临时提高最大递归深度,
+    因此嵌套的深度只受内存的限制
+    已经在这样的线程中时直接调用, 返回值和异常都与直接调用时相同
+    无法创建这样的线程时(例如禁止了内存超额分配)也退回到直接调用
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if getattr(local, "deep", False):
+            return func(*args, **kwargs)
+        result = error = None
+
+        def run():
+            nonlocal result, error
+            local.deep = True
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                error = e
+
+        with lock:
+            acquire()
+            try:
+                thread = start_thread(run)
+            except (RuntimeError, ValueError):
+                thread = None
+                release()
+        if thread == None:
+            return func(*args, **kwargs)
+        try:
+            thread.join()
+        finally:
+            with lock:
+                release()
+        if error != None:
+            raise error.with_traceback(error.__traceback__)
+        return result
+
+    return wrapper
@@ -0,0 +1,67 @@
+import os
+from array import array
+from collections import OrderedDict
+
+
+def compute_line_starts(text: str) -> array:
+    """计算每行开头的偏移, 用数组保存以减少大文件的内存占用"""
+    line_starts = array("Q", [0] if text else [])
+    i = text.find("\n")
+    while i != -1 and i + 1 < len(text):
+        line_starts.append(i + 1)
+        i = text.find("\n", i + 1)
+    return line_starts
+
+
+class SourceCache:
+    """进程内共享的源文件内容缓存
+
+    按文件的真实路径索引, 缓存的总字符数超过capacity时淘汰最久未使用的文件,
+    被淘汰的文件在下次访问时重新读取
+    """
+
+    capacity: int = 64 * 2**20  # 缓存的总字符数上限
+    # 真实路径对应的((修改时间, 大小), 内容, 每行开头的偏移)
+    entries: OrderedDict[str, tuple[tuple[int, int], str, array]] = OrderedDict()
+    size: int = 0  # 当前缓存的总字符数
+
+    @staticmethod
+    def read(realpath: str) -> tuple[tuple[int, int], str, array]:
+        """读取文件并加入缓存"""
+        stat = os.stat(realpath)
+        with open(realpath, "rb") as file:
+            text = file.read().decode("utf-8")
+        if "\r" in text:  # 与文本模式读取时一样统一换行符
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        entry = ((stat.st_mtime_ns, stat.st_size), text, compute_line_starts(text))
+        SourceCache.discard(realpath)
+        SourceCache.entries[realpath] = entry
+        SourceCache.size += len(text)
+        while SourceCache.size > SourceCache.capacity and len(SourceCache.entries) > 1:
+            SourceCache.discard(next(iter(SourceCache.entries)))
+        return entry
+
+    @staticmethod
+    def discard(realpath: str):
+        """从缓存中移除文件"""
+        entry = SourceCache.entries.pop(realpath, None)
+        if entry != None:
+            SourceCache.size -= len(entry[1])
+
+    @staticmethod
+    def get(realpath: str, check: bool = False) -> tuple[tuple[int, int], str, array]:
+        """返回文件的缓存, check为True时检查文件是否被修改过"""
+        entry = SourceCache.entries.get(realpath)
+        if entry != None and check:
+            stat = os.stat(realpath)
+            if entry[0] != (stat.st_mtime_ns, stat.st_size):
+                entry = None
+        if entry == None:
+            return SourceCache.read(realpath)
+        SourceCache.entries.move_to_end(realpath)
+        return entry
+
+    @staticmethod
+    def clear():
+        SourceCache.entries.clear()
+        SourceCache.size = 0
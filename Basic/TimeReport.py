@@ -0,0 +1,161 @@
+import sys
+import json
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import resource
+except ImportError:  # Windows上没有resource模块, 不统计峰值内存
+    resource = None
+
+
+def peak_rss() -> int:
+    """进程的峰值常驻内存(字节), 无法获取时返回0"""
+    if resource == None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024  # Linux上的单位是KB
+
+
+class Phase:
+    """一个阶段的统计结果"""
+
+    __slots__ = ("seconds", "calls", "blocks", "rss")
+
+    def __init__(self, seconds=0.0, calls=0, blocks=0, rss=0):
+        self.seconds = seconds  # 不含嵌套的其他阶段的用时(秒)
+        self.calls = calls  # 进入该阶段的次数
+        self.blocks = blocks  # 新分配且尚未释放的内存块数
+        # 处于该阶段时进程峰值常驻内存的增长(字节), 峰值只增不减, 因此各阶段之和
+        # 加上开始统计前的峰值就是进程的峰值
+        self.rss = rss
+
+
+class TimeReport:
+    """
+    统计各个阶段的用时和内存, 类似于编译器的-ftime-report
+
+    阶段可以嵌套(例如语法分析时按需进行预处理), 用时只计入最内层的阶段
+    统计内存块数和峰值内存的开销较大, 每隔sample_interval秒采样一次,
+    两次采样之间的变化计入采样时所处的阶段, 与用时一样只计入最内层
+    """
+
+    sample_interval = 0.001
+
+    def __init__(self):
+        self.phases: dict[str, Phase] = {}
+        self.stack: list[Phase] = []  # 正在进行的阶段, 最后一个是最内层的
+        self.last_time = time.perf_counter()
+        self.last_sample = self.last_time
+        self.last_blocks = sys.getallocatedblocks()
+        self.last_rss = peak_rss()
+        self.patched: list[tuple[type, str, object]] = []  # 被instrument替换的方法
+
+    def account(self, force: bool = False):
+        """把上次统计之后的用时以及内存的变化计入当前所处的阶段"""
+        now = time.perf_counter()
+        phase = self.stack[-1] if self.stack else None
+        if phase != None:
+            phase.seconds += now - self.last_time
+        self.last_time = now
+        if force or now - self.last_sample >= TimeReport.sample_interval:
+            blocks = sys.getallocatedblocks()
+            rss = peak_rss()
+            if phase != None:
+                phase.blocks += blocks - self.last_blocks
+                phase.rss += rss - self.last_rss
+            self.last_blocks = blocks
+            self.last_rss = rss
+            self.last_sample = time.perf_counter()
+            self.last_time = self.last_sample  # 不把采样本身的开销计入阶段
+
+    def enter(self, name: str):
+        self.account()
+        phase = self.phases.get(name)
+        if phase == None:
+            phase = self.phases[name] = Phase()
+        phase.calls += 1
+        self.stack.append(phase)
+
+    def leave(self):
+        # 最外层的阶段结束时一定采样, 保证单次进入的阶段也有内存数据
+        self.account(force=len(self.stack) == 1)
+        self.stack.pop()
+
+    @contextmanager
+    def phase(self, name: str):
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.leave()
+
+    def instrument(self, owner: type, attr: str, name: str):
+        """把owner的方法attr替换为统计到阶段name的版本, 直到调用restore"""
+        method = owner.__dict__[attr]
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            self.enter(name)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.leave()
+
+        self.patched.append((owner, attr, method))
+        setattr(owner, attr, wrapper)
+
+    def restore(self):
+        """恢复被instrument替换的方法"""
+        while self.patched:
+            owner, attr, method = self.patched.pop()
+            setattr(owner, attr, method)
+
+    def to_dict(self) -> dict[str, dict]:
+        return {
+            name: {
+                "seconds": phase.seconds,
+                "calls": phase.calls,
+                "blocks": phase.blocks,
+                "peak_rss_growth": phase.rss,
+            }
+            for name, phase in self.phases.items()
+        }
+
+    def merge(self, phases: dict[str, dict]):
+        """合并另一个TimeReport.to_dict()的结果, 例如批处理时各个工作进程的统计"""
+        for name, data in phases.items():
+            phase = self.phases.get(name)
+            if phase == None:
+                phase = self.phases[name] = Phase()
+            phase.seconds += data["seconds"]
+            phase.calls += data["calls"]
+            phase.blocks += data["blocks"]
+            phase.rss += data["peak_rss_growth"]
+
+    def dump(self, format: str = "text", file=None):
+        """输出统计结果, format为"text"或"json", 默认输出到标准错误"""
+        file = file if file != None else sys.stderr
+        if format == "json":
+            json.dump({"phases": self.to_dict()}, file, ensure_ascii=False, indent=2)
+            print(file=file)
+            return
+        total = sum(phase.seconds for phase in self.phases.values())
+        print("===== 各阶段的用时和内存 =====", file=file)
+        # 表头与各行使用相同的宽度
+        print(
+            f"{'用时(秒)':>12} {'占比':>7} {'次数':>9} {'新增内存块':>10}"
+            f" {'峰值增长(MB)':>12}  阶段",
+            file=file,
+        )
+        for name, phase in sorted(
+            self.phases.items(), key=lambda x: x[1].seconds, reverse=True
+        ):
+            share = phase.seconds / total if total > 0 else 0.0
+            print(
+                f"{phase.seconds:12.4f} {share:7.1%} {phase.calls:9}"
+                f" {phase.blocks:10} {phase.rss / 2**20:12.1f}  {name}",
+                file=file,
+            )
+        print(f"{total:12.4f} {'':40}  总计", file=file)
@@ -1,6 +1,8 @@
+import re
 from enum import Enum
 
 from Basic.Location import Location
+from Basic.Diagnostic import Error
 
 digit = "[0-9]"
 nonzero_digit = "[1-9]"
@@ -49,6 +51,51 @@ s_char_sequence = f"({s_char}+)"
 string_literal = f'{encoding_prefix}?"{s_char_sequence}?"'
 
 
+escape_pattern = re.compile(
+    r"\\(?:([0-7]{1,3})|x([0-9a-fA-F]+)|u([0-9a-fA-F]{4})|U([0-9a-fA-F]{8})|(.))",
+    re.DOTALL,
+)
+simple_escapes = {
+    "'": "'",
+    '"': '"',
+    "?": "?",
+    "\\": "\\",
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+    "v": "\v",
+}
+# 各个前缀对应的字符类型所能表示的最大值, 八进制和十六进制转义不能超过它
+code_unit_max = {"": 0xFF, "u8": 0xFF, "u": 0xFFFF, "U": 0x10FFFF, "L": 0x10FFFF}
+
+
+def unescape(text: str, prefix: str, location: Location) -> str:
+    """按C的规则解码字符(串)中的转义序列"""
+    if "\\" not in text:
+        return text
+
+    def replace(m: re.Match) -> str:
+        octal, hexadecimal, ucn4, ucn8, simple = m.groups()
+        if simple != None:
+            if simple not in simple_escapes:
+                raise Error(f"未知的转义序列: \\{simple}", location)
+            return simple_escapes[simple]
+        if octal != None or hexadecimal != None:
+            val = int(octal, 8) if octal != None else int(hexadecimal, 16)
+            if val > code_unit_max[prefix]:
+                raise Error(f"转义序列超出范围: {m.group()}", location)
+            return chr(val)
+        val = int(ucn4 or ucn8, 16)
+        if val > 0x10FFFF or 0xD800 <= val <= 0xDFFF:
+            raise Error(f"非法的通用字符名: {m.group()}", location)
+        return chr(val)
+
+    return escape_pattern.sub(replace, text)
+
+
 class TokenKind(Enum):
     ALIGNAS = "alignas|_Alignas"
     ALIGNOF = "alignof|_Alignof"
@@ -321,15 +368,26 @@ class Token:
         self.kind = kind
         self.location = location
         self.text = text
-        self.content = None  # 字符串内容
+        self._content = None  # 字符串内容, 第一次访问content时才解码
         self.prefix = None  # 字符串前缀
         if kind in (TokenKind.CHARCONST, TokenKind.STRINGLITERAL):
             i = self.text.find('"' if kind == TokenKind.STRINGLITERAL else "'")
             self.prefix = self.text[:i]
-            self.content = self.text[i:]
-            self.content = eval(self.content)
         self.ispphash = False  # 是否是预处理指令开头的'#'
 
+    @property
+    def content(self) -> str:
+        """字符(串)的内容"""
+        if self._content == None and self.prefix != None:
+            self._content = unescape(
+                self.text[len(self.prefix) + 1 : -1], self.prefix, self.location
+            )
+        return self._content
+
+    @content.setter
+    def content(self, content: str):
+        self._content = content
+
     def __repr__(self):
         return f"Token({self.kind.name},{self.location},{repr(self.text)})"
 
@@ -351,3 +409,35 @@ class TokenGen:
 
     def restore(self):
         """接受用于恢复的值并恢复状态"""
+
+    def commit(self):
+        """表示之后不会再恢复到当前位置之前, 可以释放之前的token"""
+
+
+class TokenList(TokenGen):
+    """从现成的token序列中读取token, 序列需要以END结尾"""
+
+    def __init__(self, tokens: list[Token]):
+        self.tokens = tokens
+        self.nexttk_index = 0  # 当前token在tokens中的索引
+
+    def curtoken(self) -> Token:
+        # 读到END之后继续读取时总是得到END
+        return self.tokens[min(self.nexttk_index, len(self.tokens)) - 1]
+
+    def next(self) -> Token:
+        self.nexttk_index += 1
+        return self.curtoken()
+
+    def back(self):
+        assert self.nexttk_index > 0
+        self.nexttk_index -= 1
+
+    def save(self):
+        return self.nexttk_index
+
+    def restore(self, index):
+        self.nexttk_index = index
+
+    def commit(self):
+        pass
@@ -1,6 +1,9 @@
 """通用模块"""
 
-from Basic.Token import TokenKind, Token, TokenGen
+from Basic.Token import TokenKind, Token, TokenGen, TokenList
 from Basic.Location import Location
+from Basic.SourceCache import SourceCache
 from Basic.FileReader import FileReader
 from Basic.Diagnostic import Diagnostic, Error, DiagnosticKind, Diagnostics
+from Basic.Recursion import deep_recursion
+from Basic.TimeReport import TimeReport
@@ -0,0 +1,60 @@
+import sys
+import os
+import time
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from Basic import FileReader
+from Lex import Preprocessor
+from Parse import Parser
+
+function_template = """
+int f{i}(int a, int b)
+{{
+    T c;
+    PT d = (PT)&c;
+    c = (T)a + b * (a - 1) / 2;
+    if (a < b && b > 0 || !a) c += 1; else c -= 1;
+    while (c > 0) --c;
+    for (int i = 0; i < 10; i++) {{
+        c = c ? i : (T)c;
+    }}
+    return sizeof(T) + c;
+}}
+"""
+
+
+def generate_source(n: int) -> str:
+    """生成一个包含n个函数定义的翻译单元"""
+    return "typedef int T;\ntypedef T *PT;\n" + "".join(
+        function_template.format(i=i) for i in range(n)
+    )
+
+
+def write_source(source: str) -> str:
+    """将源代码写入临时文件并返回文件名"""
+    fd, filename = tempfile.mkstemp(suffix=".c")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(source)
+    return filename
+
+
+def measure(func, repeat: int = 3) -> float:
+    """返回多次运行func中最短的用时(秒)"""
+    best = None
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        func()
+        t = time.perf_counter() - begin
+        best = t if best == None else min(best, t)
+    return best
+
+
+def parse(filename: str, streaming: bool = False, **kwargs):
+    lexer = Preprocessor(FileReader(filename))
+    lexer.streaming = streaming
+    parser = Parser(lexer, **kwargs)
+    ast = parser.start()
+    assert ast != None
+    return parser
@@ -0,0 +1,45 @@
+"""比较按FIRST集合剪枝前后分析Parse/Test中所有测试用例的用时"""
+
+import glob
+from Common import *
+from Basic import TokenKind
+
+corpus = sorted(
+    glob.glob(os.path.join(os.path.dirname(__file__), "..", "Parse", "Test", "*.txt"))
+)
+
+
+def parse_corpus(prune: bool, repeat: int):
+    """测试用例中有外部声明, 语句和表达式, 依次尝试直到全部分析完或者失败"""
+    for _ in range(repeat):
+        for filename in corpus:
+            lexer = Preprocessor(FileReader(filename))
+            parser = Parser(lexer, record_call_tree=False, prune=prune)
+            parser.nexttoken()
+            while parser.curtoken().kind != TokenKind.END:
+                for method in (
+                    parser.external_declaration,
+                    parser.block_item,
+                    parser.expression,
+                ):
+                    z = parser.save()
+                    if method() != None:
+                        break
+                    parser.restore(z)
+                else:
+                    break
+
+
+def main():
+    for prune in (False, True):
+        t = measure(lambda: parse_corpus(prune, 20))
+        print(f"Parse/Test x20, prune={prune}: {t:.3f}s")
+    filename = write_source(generate_source(80))
+    for prune in (False, True):
+        t = measure(lambda: parse(filename, record_call_tree=False, prune=prune))
+        print(f"  80 functions, prune={prune}: {t:.3f}s")
+    os.remove(filename)
+
+
+if __name__ == "__main__":
+    main()
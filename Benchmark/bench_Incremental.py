@@ -0,0 +1,34 @@
+"""比较编辑之后完整分析与增量分析的用时"""
+
+from Common import *
+from Parse import IncrementalParser
+
+
+def main():
+    for n in (100, 400, 1600):
+        source = generate_source(n)
+        parser = IncrementalParser("bench.c", source)
+        full = measure(parser.parse, repeat=1)
+        # 在中间的函数里交替修改同一处表达式, 修改前后长度不同
+        begin = source.index(f"int f{n // 2}(")
+        begin = source.index("b * (a - 1)", begin)
+        edits = ["b * (a - 1)", "b * (a - 10)"]
+        i = 0
+
+        def reparse():
+            nonlocal i
+            old, new = edits[i % 2], edits[(i + 1) % 2]
+            assert parser.reparse(begin, begin + len(old), new) != None
+            i += 1
+
+        incremental = measure(reparse, repeat=10)
+        assert parser.full_parses == 2
+        lines = source.count("\n")
+        print(
+            f"{lines:>6} lines: full {full * 1000:9.1f} ms, "
+            f"incremental {incremental * 1000:7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""测量词法分析的速度和内存峰值"""
+
+import tracemalloc
+from Common import *
+from Basic import TokenKind
+from Lex import Lexer, TokenCache
+
+
+def lex(filename: str) -> int:
+    """对文件进行词法分析, 返回token的数量"""
+    lexer = Lexer(FileReader(filename))
+    while lexer.next().kind != TokenKind.END:
+        pass
+    return len(lexer.tokens)
+
+
+def main():
+    for n in (10, 40, 160):
+        filename = write_source(generate_source(n))
+        count = lex(filename)
+        t = measure(lambda: lex(filename))
+        with tempfile.TemporaryDirectory() as cache_dir:
+            Lexer.token_cache = TokenCache(cache_dir)
+            lex(filename)  # 生成缓存
+            t_cached = measure(lambda: lex(filename))
+            Lexer.token_cache = None
+        tracemalloc.start()
+        lex(filename)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(
+            f"{os.path.getsize(filename):>8} bytes: {count / t:>9.0f} tokens/s "
+            f"(cached: {count / t_cached:>9.0f} tokens/s), "
+            f"peak {peak / 2**20:.1f} MiB"
+        )
+        os.remove(filename)
+
+
+if __name__ == "__main__":
+    main()
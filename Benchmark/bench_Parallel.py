@@ -0,0 +1,25 @@
+"""比较切分成外部声明后用多个进程进行语法分析与单个进程的用时"""
+
+from Common import *
+from Parse import ParallelParser
+
+
+def parallel_parse(filename: str, jobs: int):
+    parser = ParallelParser(Preprocessor(FileReader(filename)), jobs=jobs)
+    assert parser.start() != None
+
+
+def main():
+    for n in (50, 200):
+        filename = write_source(generate_source(n))
+        serial = measure(lambda: parse(filename, record_call_tree=False), repeat=1)
+        result = [f"serial {serial:.2f}s"]
+        for jobs in sorted({2, os.cpu_count()}):
+            t = measure(lambda: parallel_parse(filename, jobs), repeat=1)
+            result.append(f"{jobs} jobs {t:.2f}s ({serial / t:.1f}x)")
+        print(f"{n:>4} functions: " + ", ".join(result))
+        os.remove(filename)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""比较不同模式下的解析用时"""
+
+from Common import *
+
+modes = {
+    "normal": {},
+    "packrat": {"packrat": True},
+    "no call tree": {"record_call_tree": False},
+}
+
+
+def main():
+    for n in (5, 20, 80):
+        filename = write_source(generate_source(n))
+        result = []
+        for name, kwargs in modes.items():
+            t = measure(lambda: parse(filename, **kwargs))
+            result.append(f"{name} {t:.3f}s")
+        print(f"{n:>4} functions: " + ", ".join(result))
+        os.remove(filename)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""分析嵌套很深的代码, 检查不会出现RecursionError, 并且用时随深度线性增长"""
+
+from Common import *
+
+sources = {
+    "parentheses": lambda n: "int a = " + "(" * n + "1" + ")" * n + ";\n",
+    "initializer": lambda n: "int a = " + "{" * n + "1" + "}" * n + ";\n",
+    "compound statement": lambda n: "void f(void)\n" + "{" * n + "}" * n + "\n",
+    "else if": lambda n: "void f(int a)\n{\n    if (a == 0) a;\n"
+    + "".join(f"    else if (a == {i}) a;\n" for i in range(1, n))
+    + "}\n",
+    "unary operator": lambda n: "int a = " + "- " * n + "1;\n",
+}
+
+
+def main():
+    for name, generate in sources.items():
+        result = []
+        for n in (1000, 10000):
+            filename = write_source(generate(n))
+            t = measure(lambda: parse(filename, record_call_tree=False), repeat=1)
+            result.append(f"{n} {t:.3f}s")
+            os.remove(filename)
+        print(f"{name:>20}: " + ", ".join(result))
+
+
+if __name__ == "__main__":
+    main()
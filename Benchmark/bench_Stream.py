@@ -0,0 +1,26 @@
+"""比较流式模式与普通模式下保留的token数量和内存峰值"""
+
+import tracemalloc
+from Common import *
+
+
+def main():
+    for n in (20, 80, 320):
+        filename = write_source(generate_source(n))
+        result = []
+        for streaming in (False, True):
+            tracemalloc.start()
+            parser = parse(filename, streaming=streaming, record_call_tree=False)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            name = "streaming" if streaming else "normal"
+            result.append(
+                f"{name} {len(parser.tokengen.tokens):>6} tokens kept, "
+                f"peak {peak / 2**20:.1f} MiB"
+            )
+        print(f"{n:>4} functions: " + "; ".join(result))
+        os.remove(filename)
+
+
+if __name__ == "__main__":
+    main()
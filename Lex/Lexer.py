@@ -1,39 +1,142 @@
-from copy import deepcopy
 import re
-import unicodedata
+from bisect import bisect_right
+from typing import Optional
 
 from Basic import Token, TokenGen, TokenKind, Error, FileReader, Location
+from Lex.TokenCache import TokenCache
+
+encoding_prefix = "(?:u8|u|U|L)?"
+# 各个分组按顺序尝试, 字符串和字符常量先宽松地匹配到结尾的引号, 再用TokenKind中的正则检查
+token_pattern = re.compile(
+    "|".join(
+        [
+            r"(?P<SPACE>[^\S\n]+|\n)",
+            r"(?P<COMMENT>//[^\n]*|/\*[\s\S]*?(?:\*/|\Z))",
+            rf'(?P<STRINGLITERAL>{encoding_prefix}"(?:[^"\\\n]|\\.)*")',
+            rf"(?P<CHARCONST>{encoding_prefix}'(?:[^'\\\n]|\\.)*')",
+            rf"(?P<UNTERMINATED>{encoding_prefix}[\"'])",
+            r"(?P<FLOATCONST>(?=\.?[0-9])(?:"
+            + TokenKind.FLOATCONST.value
+            + "))",
+            f"(?P<INTCONST>{TokenKind.INTCONST.value})",
+            r"(?P<IDENTIFIER>[^\W\d]\w*)",
+            "(?P<PUNCTUATOR>["
+            + "".join(re.escape(i) for i in sorted({i[0] for i in Token.punctuator}))
+            + "])",
+            "(?P<UNKOWN>.)",
+        ]
+    )
+)
+# punctuator可能的长度, 从长到短依次查表以实现最长匹配
+punctuator_lengths = sorted({len(i) for i in Token.punctuator}, reverse=True)
+string_pattern = re.compile(TokenKind.STRINGLITERAL.value)
+char_pattern = re.compile(TokenKind.CHARCONST.value)
+lexeme_groups = list(token_pattern.groupindex)  # 分组名, 在缓存中以下标表示
+
+
+def match_lexeme(text: str, begin: int) -> tuple[str, int]:
+    """匹配从begin开始的词素, 返回所属的分组和结束的偏移"""
+    match = token_pattern.match(text, begin)
+    group = match.lastgroup
+    if group == "PUNCTUATOR":
+        # 在punctuator表中从长到短查找, 最多查找三次
+        for length in punctuator_lengths:
+            punctuator = text[begin : begin + length]
+            if punctuator in Token.punctuator:
+                return group, begin + len(punctuator)
+    return group, match.end()
+
+
+def scan(text: str) -> dict[int, tuple[str, int, str]]:
+    """一次扫描整个文本, 返回起始偏移到(分组, 结束偏移, 文本)的映射, 遇到未结束的字符(串)时停止"""
+    lexemes = {}
+    begin = 0
+    while begin < len(text):
+        group, end = match_lexeme(text, begin)
+        if group == "UNTERMINATED":
+            break
+        lexemes[begin] = (group, end, "" if group == "SPACE" else text[begin:end])
+        begin = end
+    return lexemes
+
+
+def splice_lines(text: str) -> tuple[str, list[int]]:
+    """删除行尾的反斜杠和换行符, 把物理源码行组合成逻辑源码行
+
+    返回逻辑行组成的文本, 以及每处被删除的位置在该文本中的偏移
+    """
+    if "\\\n" not in text:
+        return text, []
+    parts = text.split("\\\n")
+    splices = []
+    offset = 0
+    for part in parts[:-1]:
+        offset += len(part)
+        splices.append(offset)
+    return "".join(parts), splices
 
 
 class Lexer(TokenGen):
+    token_cache: Optional[TokenCache] = None  # 词素的磁盘缓存, 为None时不使用
+
     def __init__(self, reader: FileReader):
         self.reader = reader
         self.tokens: list[Token] = []  # 当前已经读到的token
-        self.nexttk_index = 0  # 当前token索引
-        self.hasread: list[tuple[str, Location]] = []  # 已经读到的字符
-        self.nextindex = 0
+        self.nexttk_index = 0  # 当前token在tokens中的索引
+        self.streaming = False  # 流式模式下commit()会丢弃已经确认的token
+        self.base = 0  # 已经丢弃的token数量, save()返回的是加上它之后的索引
+        self.text, self.splices = splice_lines(reader.text)
+        self.nextindex = 0  # 下一个字符在text中的偏移
+        self.lexemes: Optional[dict[int, tuple[str, int, str]]] = None  # 缓存的词素
+        # 给定了内容的文件(例如编辑器中的缓冲区)与磁盘上的文件不同, 不使用缓存
+        if (
+            Lexer.token_cache != None
+            and reader.filename != None
+            and reader.source.realpath != None
+        ):
+            self.lexemes = Lexer.token_cache.load(
+                reader.filename, reader.text, lexeme_groups
+            )
+            if self.lexemes == None:
+                self.lexemes = scan(self.text)
+                Lexer.token_cache.save(
+                    reader.filename, reader.text, lexeme_groups, self.lexemes
+                )
+
+    def physical(self, index: int) -> int:
+        """返回text中的偏移在原文件中对应的偏移"""
+        if not self.splices:
+            return index
+        return index + 2 * bisect_right(self.splices, index)
+
+    def location(self, index: int) -> Location:
+        """返回text中偏移处的字符对应的片段"""
+        return self.reader.location(self.physical(index))
+
+    def span(self, begin: int, end: int) -> Location:
+        """返回text[begin:end]对应的片段, 跳过其中被删除的反斜杠和换行符"""
+        if end <= begin:
+            return self.location(begin)
+        location = None
+        while begin < end:
+            i = bisect_right(self.splices, begin)
+            seg_end = min(self.splices[i], end) if i < len(self.splices) else end
+            seg = self.reader.span(self.physical(begin), self.physical(seg_end - 1) + 1)
+            location = seg if location == None else location + seg
+            begin = seg_end
+        return location
 
     def getch(self) -> tuple[str, Location]:
-        if self.nextindex >= len(self.hasread):
-            char, location = self.reader.next()
-            while char == "\\":
-                # 凡在反斜杠出现于行尾（紧跟换行符）时，删除反斜杠和换行符，把两个物理源码行组合成一个逻辑源码行
-                ch, _ = self.reader.next()
-                if ch == "\n":
-                    char, location = self.reader.next()
-                else:
-                    self.reader.back()
-                    break
-            self.hasread.append((char, location))
-        ch, location = self.hasread[self.nextindex]
+        index = self.nextindex
         self.nextindex += 1
-        return ch, deepcopy(location)
+        return self.text[index : index + 1], self.location(index)
 
     def ungetch(self):
         self.nextindex -= 1
 
     def curch(self):
-        return self.hasread[self.nextindex - 1]
+        index = self.nextindex - 1
+        return self.text[index : index + 1], self.location(index)
 
     def curtoken(self) -> Token:
         return self.tokens[self.nexttk_index - 1]
@@ -53,146 +156,59 @@ class Lexer(TokenGen):
         self.nexttk_index -= 1
 
     def save(self):
-        return self.nexttk_index
+        return self.base + self.nexttk_index
 
     def restore(self, index):
-        self.nexttk_index = index
+        assert index >= self.base, "不能恢复到已经丢弃的位置"
+        self.nexttk_index = index - self.base
+
+    def commit(self):
+        if not self.streaming or self.nexttk_index <= 1:
+            return
+        n = self.nexttk_index - 1  # 保留当前token
+        del self.tokens[:n]
+        self.base += n
+        self.nexttk_index -= n
 
     def getNewToken(self) -> Token:
         """获取下一个新的token"""
-        ch, location = self.getch()
-        if ch.isspace():  # 去除空白字符
-            return None
-        if ch == "":
-            return Token(TokenKind.END, location, ch)
-        elif self.isIdentifierStart(ch):
-            text = ch
-            ch, loc = self.getch()
-            while ch and self.isIdentifierContinue(ch):
-                text += ch
-                location.extend(loc)
-                ch, loc = self.getch()
-
-            if text in ("u8", "u", "U", "L") and ch in (
-                '"',
-                "'",
-            ):  # 字符常量或字符串字面量
-                loc = location + loc
-                if ch == '"':
-                    return self.matchStringOrChar(
-                        loc, TokenKind.STRINGLITERAL, text + ch
-                    )
-                elif ch == "'":
-                    return self.matchStringOrChar(loc, TokenKind.CHARCONST, text + ch)
-            self.ungetch()
-            return Token(
-                Token.keywords.get(text, TokenKind.IDENTIFIER),
-                location,
-                text,
-            )
-        elif ch == '"':
-            return self.matchStringOrChar(location, TokenKind.STRINGLITERAL, ch)
-        elif ch == "'":
-            return self.matchStringOrChar(location, TokenKind.CHARCONST, ch)
-        elif ch.isdigit():
-            return self.matchDigit(location, ch)
-        elif ch == ".":
-            ch, loc = self.getch()
-            if ch.isdigit():
-                location.extend(loc)
-                return self.matchDigit(location, "." + ch)
-            elif ch == ".":
-                ch, loc2 = self.getch()
-                if ch == ".":
-                    location.extend(loc + loc2)
-                    return Token(TokenKind.ELLIPSIS, location, "...")
-                else:
-                    self.ungetch()
-            self.ungetch()
-            ch = self.curch()[0]  # 之前更改过ch的值
-        return self.matchPunctuator(location, ch)
-
-    def matchDigit(self, location: Location, text=""):
-        """匹配数字"""
-        # 获取这行的代码
-        follow_loc = list(location)
-        code = text
-        ch, loc = self.getch()
-        while ch and ch != "\n":
-            code += ch
-            follow_loc.extend(loc)
-            ch, loc = self.getch()
-        # 尝试匹配数字
-        g = re.match(TokenKind.FLOATCONST.value, code)
-        kind = None
-        if g and g.span()[0] == 0:
-            kind = TokenKind.FLOATCONST
+        begin = self.nextindex
+        if begin >= len(self.text):
+            self.nextindex += 1
+            return Token(TokenKind.END, self.location(begin), "")
+        lexeme = self.lexemes.get(begin) if self.lexemes != None else None
+        if lexeme != None:
+            group, end, text = lexeme
         else:
-            g = re.match(TokenKind.INTCONST.value, code)
-            if g and g.span()[0] == 0:
-                kind = TokenKind.INTCONST
-        assert kind != None
-        # 获取匹配到的文本
-        text = code[g.span()[0] : g.span()[1]]
-        location.extend(follow_loc[g.span()[0] : g.span()[1]])
-        token = Token(kind, location, text)
-        for _ in range(g.span()[1], len(code) + 1):
-            self.ungetch()
-        return token
-
-    def matchStringOrChar(self, location: Location, kind: TokenKind, text=""):
-        """匹配字符(串)"""
-        quote = '"' if kind == TokenKind.STRINGLITERAL else "'"
-
-        ch, loc = self.getch()
-        while ch and ch != "\n":
-            text += ch
-            location.extend(loc)
-            if ch == quote and text[-2] != "\\":
-                break
-            ch, loc = self.getch()
-        else:
-            raise Error("字符(串)未结束", location)
-        if re.fullmatch(kind.value, text):
-            return Token(kind, location, text)
-        raise Error("非法的字符(串)", location)
-
-    def matchPunctuator(self, location: Location, text="") -> Token:
-        """根据token的正则表达式匹配punctuator"""
-        token = Token(TokenKind.UNKOWN, deepcopy(location), text)
-        while True:
-            for kind in TokenKind:
-                if kind not in Token.punctuator.values():
-                    continue
-                if re.fullmatch(kind.value, text):
-                    break
-            else:
-                if len(text) > 1:
-                    self.ungetch()
-                break
-            token = Token(kind, deepcopy(location), text)
-            ch, loc = self.getch()
-            if not ch:
-                break
-            text += ch
-            location.extend(loc)
-        return token
-
-    def isIdentifierStart(self, ch: str):
-        """判断字符是否可以作为标识符开头"""
-        try:
-            return ch == "_" or ch.isalpha() or "XID_Start" in unicodedata.name(ch)
-        except:
-            return False
-
-    def isIdentifierContinue(self, ch):
-        """判断字符是否可以作为标识符后继"""
-        try:
-            return (
-                ch == "_"
-                or ch.isdigit()
-                or ch.isalpha()
-                or "XID_Continue" in unicodedata.name(ch)
+            group, end = match_lexeme(self.text, begin)
+            text = self.text[begin:end]
+        self.nextindex = end
+        if group == "SPACE":  # 去除空白字符
+            return None
+        location = self.span(begin, end)
+        if group == "COMMENT":
+            if text.startswith("//"):
+                return self.handleComment(location, text[2:])
+            return self.handleComment(
+                location, text[2:-2] if text.endswith("*/") and len(text) > 3 else text[2:]
             )
-        except:
-            return False
+        elif group == "PUNCTUATOR":
+            return Token(Token.punctuator[text], location, text)
+        elif group == "IDENTIFIER":
+            return Token(Token.keywords.get(text, TokenKind.IDENTIFIER), location, text)
+        elif group in ("STRINGLITERAL", "CHARCONST"):
+            kind = TokenKind[group]
+            pattern = string_pattern if kind == TokenKind.STRINGLITERAL else char_pattern
+            if pattern.fullmatch(text):
+                return Token(kind, location, text)
+            raise Error("非法的字符(串)", location)
+        elif group == "UNTERMINATED":
+            line_end = self.text.find("\n", begin)
+            if line_end == -1:
+                line_end = len(self.text)
+            raise Error("字符(串)未结束", self.span(begin, line_end))
+        return Token(TokenKind[group], location, text)
+
+    def handleComment(self, location: Location, text: str) -> Token:
+        """处理注释, 默认将注释当作空白字符丢弃"""
+        return None
@@ -46,6 +46,14 @@ class Macro:
                 return i
         return -1
 
+    def concat(self, tokens: list[Token]) -> list[Token]:
+        """'##'运算: 将tokens的文本连接起来重新进行词法分析"""
+        lexer = Lexer(ConcatReader(tokens))
+        token = lexer.next()
+        while token.kind != TokenKind.END:
+            token = lexer.next()
+        return lexer.tokens[:-1]
+
     def replace(self, args: list["MacroArg"]) -> list[Token]:
         """进行宏替换, 返回替换后的结果"""
 
@@ -185,12 +193,7 @@ class Macro:
             if not tokens:
                 new[start:end] = [PlaceMarker(new[i].location)]
                 return
-            reader = ConcatReader(tokens)
-            lexer = Lexer(reader)
-            token = lexer.next()
-            while token.kind != TokenKind.END:
-                token = lexer.next()
-            new[start:end] = lexer.tokens[:-1]
+            new[start:end] = self.concat(tokens)
 
         i = 0
         while i < len(new):
@@ -201,13 +204,13 @@ class Macro:
                         handle_concatmarker(j)
                         j -= 1
                     j += 1
-                location = Location(new[i].location)
+                location = new[i].location
                 text = []
                 for k in range(i + 1, j):
                     if isinstance(new[k], PlaceMarker):
                         continue
                     text.append(new[k].text)
-                    location.extend(new[k].location)
+                    location = location + new[k].location
                 text = " ".join(text)
                 new[i : j + 1] = [
                     Token(
@@ -0,0 +1,184 @@
+import sys
+import time
+from typing import Optional
+from Lex.Macro import Macro
+from Lex.Preprocessor import Preprocessor
+
+predefined_macros = ("__DATE__", "__FILE__", "__LINE__", "__TIME__")
+
+
+class MacroStat:
+    """一个宏的统计结果"""
+
+    __slots__ = (
+        "expansions",
+        "tokens",
+        "depth",
+        "seconds",
+        "args_seconds",
+        "concat_seconds",
+    )
+
+    def __init__(self):
+        self.expansions = 0  # 展开次数
+        self.tokens = 0  # 展开结果的token总数
+        self.depth = 0  # 最大的重新扫描深度, 直接出现在源代码中的宏为1
+        self.seconds = 0.0  # 展开的累计用时(秒), 包括获取实参, 递归展开只计算最外层
+        self.args_seconds = 0.0  # 其中获取并展开实参(getMacroArgs)的用时
+        self.concat_seconds = 0.0  # 其中'##'运算的用时
+
+
+class MacroStats:
+    """
+    统计每个宏的展开情况
+
+    instrument之后Preprocessor.replaceMacro, Preprocessor.getMacroArgs,
+    Macro.replace以及Macro.concat都会被替换为进行统计的版本,
+    直到调用restore_methods, 因此不统计时没有额外开销
+
+    重新扫描深度: 展开结果中的宏的深度为被展开的宏的深度加1,
+    例如"#define A B", "#define B 1"时源代码中的A深度为1, 展开A得到的B深度为2
+    """
+
+    def __init__(self):
+        self.macros: dict[str, MacroStat] = {}
+        # 每个预处理器中尚未扫描完的展开结果的[结束位置, 深度], 位置是加上base之后的索引
+        self.regions: dict[Preprocessor, list[list[int]]] = {}
+        self.level: dict[str, int] = {}  # 每个宏正在展开的层数
+        self.replaced = 0  # 最近一次展开结果的token数
+        self.patched: list[tuple[type, str, object]] = []
+
+    def stat(self, name: str) -> MacroStat:
+        stat = self.macros.get(name)
+        if stat == None:
+            stat = self.macros[name] = MacroStat()
+        return stat
+
+    def instrument(self):
+        self.patch(Preprocessor, "replaceMacro", self.replace_macro_wrapper)
+        self.patch(Preprocessor, "getMacroArgs", self.get_macro_args_wrapper)
+        self.patch(Macro, "replace", self.replace_wrapper)
+        self.patch(Macro, "concat", self.concat_wrapper)
+
+    def patch(self, owner: type, attr: str, make_wrapper):
+        method = owner.__dict__[attr]
+        self.patched.append((owner, attr, method))
+        setattr(owner, attr, make_wrapper(method))
+
+    def restore_methods(self):
+        while self.patched:
+            owner, attr, method = self.patched.pop()
+            setattr(owner, attr, method)
+
+    def replace_macro_wrapper(self, method):
+        def replaceMacro(pp: Preprocessor):
+            name = pp.curtoken().text
+            if name not in pp.macros and name not in predefined_macros:
+                return method(pp)
+            start = pp.base + pp.nexttk_index - 1
+            regions = self.regions.setdefault(pp, [])
+            while regions and regions[-1][0] <= start:  # 已经扫描完的展开结果
+                regions.pop()
+            depth = regions[-1][1] + 1 if regions else 1
+            count = len(regions)
+            length = pp.base + len(pp.tokens)
+            level = self.level.get(name, 0)
+            self.level[name] = level + 1
+            begin = time.perf_counter()
+            try:
+                ret = method(pp)
+            finally:
+                elapsed = time.perf_counter() - begin
+                self.level[name] = level
+            if not ret:
+                return ret
+            stat = self.stat(name)
+            stat.expansions += 1
+            stat.depth = max(stat.depth, depth)
+            if level == 0:
+                stat.seconds += elapsed
+            if name in predefined_macros:
+                stat.tokens += 1
+                self.replaced = 1
+            # 展开实参得到的区间已经被替换掉, 包含这次展开的区间随之伸缩
+            del regions[count:]
+            delta = pp.base + len(pp.tokens) - length
+            for region in regions:
+                region[0] += delta
+            regions.append([start + self.replaced, depth])
+            return ret
+
+        return replaceMacro
+
+    def get_macro_args_wrapper(self, method):
+        def getMacroArgs(pp: Preprocessor, macro: Macro):
+            begin = time.perf_counter()
+            try:
+                return method(pp, macro)
+            finally:
+                if self.level.get(macro.name, 0) <= 1:  # 与seconds一样只计算最外层
+                    self.stat(macro.name).args_seconds += time.perf_counter() - begin
+
+        return getMacroArgs
+
+    def replace_wrapper(self, method):
+        def replace(macro: Macro, args):
+            ret = method(macro, args)
+            self.stat(macro.name).tokens += len(ret)
+            self.replaced = len(ret)  # 外层宏的实参在调用replace之前已经展开完毕
+            return ret
+
+        return replace
+
+    def concat_wrapper(self, method):
+        def concat(macro: Macro, tokens):
+            begin = time.perf_counter()
+            try:
+                return method(macro, tokens)
+            finally:
+                if self.level.get(macro.name, 0) <= 1:
+                    elapsed = time.perf_counter() - begin
+                    self.stat(macro.name).concat_seconds += elapsed
+
+        return concat
+
+    def to_dict(self) -> dict[str, dict]:
+        return {
+            name: {key: getattr(stat, key) for key in MacroStat.__slots__}
+            for name, stat in self.macros.items()
+            if stat.expansions
+        }
+
+    def merge(self, macros: dict[str, dict]):
+        """合并另一个MacroStats.to_dict()的结果"""
+        for name, data in macros.items():
+            stat = self.stat(name)
+            for key in MacroStat.__slots__:
+                if key == "depth":
+                    stat.depth = max(stat.depth, data[key])
+                else:
+                    setattr(stat, key, getattr(stat, key) + data[key])
+
+    def dump(self, limit: Optional[int] = None, file=None):
+        """按展开的用时从多到少输出前limit个宏, 默认输出到标准错误"""
+        file = file if file != None else sys.stderr
+        macros = sorted(
+            ((name, stat) for name, stat in self.macros.items() if stat.expansions),
+            key=lambda x: (x[1].seconds, x[1].expansions),
+            reverse=True,
+        )
+        if limit != None:
+            macros = macros[:limit]
+        print("===== 各个宏的展开情况(按用时排序) =====", file=file)
+        print(
+            f"{'用时(秒)':>8} {'实参(秒)':>8} {'##(秒)':>8} {'展开次数':>6}"
+            f" {'输出token':>9} {'最大深度':>6}  宏",
+            file=file,
+        )
+        for name, stat in macros:
+            print(
+                f"{stat.seconds:12.4f} {stat.args_seconds:12.4f}"
+                f" {stat.concat_seconds:10.4f} {stat.expansions:10}"
+                f" {stat.tokens:11} {stat.depth:10}  {name}",
+                file=file,
+            )
@@ -1,11 +1,51 @@
 import os
+import re
 import datetime
 from enum import Enum
 from typing import Optional
 from Basic import Diagnostic, Error, Token, TokenKind, FileReader, DiagnosticKind
-from Lex.Lexer import Lexer
+from Basic.SourceCache import SourceCache
+from Lex.Lexer import Lexer, splice_lines
 from Lex.Macro import Macro, MacroArg
 
+comment_pattern = re.compile(
+    r"""(?P<literal>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')|//[^\n]*|/\*[\s\S]*?\*/"""
+)
+guard_pattern = re.compile(r"\s*#[ \t]*ifndef[ \t]+([^\W\d]\w*)[ \t]*\n")
+directive_pattern = re.compile(r"^[ \t]*#[ \t]*([a-z]+)", re.MULTILINE)
+# 跳过组时只关心行首的预处理指令, 注释和字符(串)需要整体跳过以免误认其中的'#'
+skip_pattern = re.compile(
+    r"""/\*[\s\S]*?(?:\*/|\Z)|//[^\n]*|"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|^[ \t]*(#)[ \t]*([a-z]*)""",
+    re.MULTILINE,
+)
+
+
+def detect_include_guard(text: str) -> Optional[str]:
+    """检测文件是否整个被"#ifndef X ... #endif"包围, 是则返回保护宏X, 否则返回None"""
+    text = splice_lines(text)[0]
+    # 将注释替换为空白, 保留其中的换行
+    text = comment_pattern.sub(
+        lambda m: m.group() if m.group("literal") else re.sub(r"[^\n]", " ", m.group()),
+        text,
+    )
+    guard = guard_pattern.match(text)
+    if guard == None:
+        return None
+    level = 1
+    for directive in directive_pattern.finditer(text, guard.end()):
+        keyword = directive.group(1)
+        if keyword in ("if", "ifdef", "ifndef"):
+            level += 1
+        elif keyword in ("elif", "elifdef", "elifndef", "else") and level == 1:
+            return None
+        elif keyword == "endif":
+            level -= 1
+            if level == 0:
+                line_end = text.find("\n", directive.end())
+                rest = "" if line_end == -1 else text[line_end + 1 :]
+                return guard.group(1) if rest.strip() == "" else None
+    return None
+
 
 class PPState(Enum):
     """预处理器状态"""
@@ -21,6 +61,8 @@ class PPState(Enum):
 
 class Preprocessor(Lexer):
     include_path: list[str] = []  # 包含文件查找路径
+    # 文件的真实路径对应的(修改时间, 大小, 保护宏), 没有保护宏时为None
+    include_guards: dict[str, tuple[int, int, Optional[str]]] = {}
 
     def __init__(self, reader: FileReader):
         super().__init__(reader)
@@ -31,20 +73,14 @@ class Preprocessor(Lexer):
         self.condpp_val: list[bool] = []  # 条件预处理指令的结果
         self.headerpp: list[Preprocessor] = []  # 包含的文件的预处理器
         self.filename = self.reader.filename  # 用于 __FILE__ 替换
+        self.once_files: set[str] = set()  # 使用了"#pragma once"的文件的真实路径
         self.line_shift = 0  # 用于 __LINE__ 替换时进行调整
 
     def check_pphash(self):
         """判断当前读到的'#'是否算是预处理器指令"""
-        i = self.nextindex - 2
-        atbegineofline = True  # 位于行首
-        while i >= 0:
-            if self.hasread[i][0] == "\n":
-                break
-            if not self.hasread[i][0].isspace():
-                atbegineofline = False
-                break
-            i -= 1
-        return atbegineofline
+        end = self.nextindex - 1
+        begin = self.text.rfind("\n", 0, end) + 1
+        return self.text[begin:end].strip() == ""  # 位于行首
 
     def next(self):
         token = super().next()
@@ -79,9 +115,9 @@ class Preprocessor(Lexer):
             t = self.save()
             token2 = super().next()
             if token2.kind == TokenKind.STRINGLITERAL:
+                token.content += token2.content  # 需要在修改text之前解码
                 token.text += " " + token2.text
-                token.content += token2.content
-                token.location.extend(token2.location)
+                token.location = token.location + token2.location
                 prefix_index = ["", "u8", "L", "u", "U"]
                 token.prefix = prefix_index[
                     max(
@@ -103,51 +139,19 @@ class Preprocessor(Lexer):
                 self.headerpp.pop()
                 return None
             return token
-        ch, location = self.getch()
-        if ch == "/":
-            ch, loc = self.getch()
-            location.extend(loc)
-            if ch == "/":
-                text = ""
-                ch, loc = self.getch()
-                while ch and ch != "\n":
-                    text += ch
-                    location.extend(loc)
-                    ch, loc = self.getch()
-                return (
-                    Token(TokenKind.COMMENT, location, text)
-                    if PPState.IGNORECOMMENT not in self.state
-                    else None
-                )
-            elif ch == "*":
-                text = ""
-                ch, loc = self.getch()
-                while ch and text[-2:] != "*/":
-                    text += ch
-                    location.extend(loc)
-                    ch, loc = self.getch()
-                self.ungetch()
-                return (
-                    Token(TokenKind.COMMENT, location, text[:-2])
-                    if PPState.IGNORECOMMENT not in self.state
-                    else None
-                )
-            else:
-                # 多读了两个
-                self.ungetch()
-                self.ungetch()
-        elif ch == "\n" and PPState.HANDLINGDIRECTIVE in self.state:
+        ch = self.text[self.nextindex : self.nextindex + 1]
+        if ch == "\n" and PPState.HANDLINGDIRECTIVE in self.state:
+            ch, location = self.getch()
             return Token(TokenKind.NEWLINE, location, ch)
         elif ch == "<" and PPState.HANDLINGINCLUDE in self.state:
-            text = ""
-            ch, loc = self.getch()
-            while ch and ch != ">":
-                text += ch
-                location.extend(loc)
-                ch, loc = self.getch()
-            return Token(TokenKind.HEADERNAME, location, text)
-        else:
-            self.ungetch()
+            begin = self.nextindex
+            end = self.text.find(">", begin)
+            if end == -1:
+                end = len(self.text)
+            self.nextindex = end + 1
+            return Token(
+                TokenKind.HEADERNAME, self.span(begin, end), self.text[begin + 1 : end]
+            )
         token = super().getNewToken()
         if token != None:
             if token.kind == TokenKind.IDENTIFIER:
@@ -156,6 +160,18 @@ class Preprocessor(Lexer):
                 token.ispphash = self.check_pphash()
         return token
 
+    def commit(self):
+        super().commit()
+        for pp in self.headerpp:  # 包含文件中的token已经全部交给了当前的预处理器
+            pp.commit()
+
+    def handleComment(self, location, text):
+        return (
+            Token(TokenKind.COMMENT, location, text)
+            if PPState.IGNORECOMMENT not in self.state
+            else None
+        )
+
     def handleDirective(self) -> list[Token]:
         """处理预处理指令并返回新的token序列"""
 
@@ -224,11 +240,12 @@ class Preprocessor(Lexer):
                 include_path = ["."] + include_path
             else:
                 raise Error('期望得到<FILENAME>或者"FILENAME"', token.location)
-            pp = self.include(token.text, include_path)
-            if pp == None:
+            filepath = self.findInclude(token.text, include_path)
+            if filepath == None:
                 raise Error(f"无法包含文件: {token.text}", token.location)
             read_until_line_end()
-            self.headerpp.append(pp)
+            if not self.skipInclude(filepath):
+                self.headerpp.append(self.include(filepath))
 
             self.state.pop()
         elif token.kind == TokenKind.EMBED:
@@ -249,7 +266,7 @@ class Preprocessor(Lexer):
             if token.kind != TokenKind.INTCONST:
                 raise Error("#line期望得到一个整数")
             val = int(token.text)
-            self.line_shift = val - token.location[0]["lineno"]
+            self.line_shift = val - token.location.lineno
 
             token = self.next()
             if token.kind == TokenKind.STRINGLITERAL:
@@ -258,6 +275,9 @@ class Preprocessor(Lexer):
             self.state.pop()
             read_until_line_end()
         elif token.kind == TokenKind.PRAGMA:
+            token = self.next()
+            if token.kind == TokenKind.IDENTIFIER and token.text == "once":
+                self.once_files.add(os.path.realpath(self.reader.filename))
             read_until_line_end()
         elif token.kind not in (TokenKind.NEWLINE, TokenKind.END):
             raise Error("未知的预处理器参数", token.location)
@@ -329,7 +349,7 @@ class Preprocessor(Lexer):
                 token = Token(
                     TokenKind.INTCONST,
                     self.curtoken().location,
-                    f'{self.curtoken().location[0]["lineno"]+self.line_shift}',
+                    f'{self.curtoken().location.lineno+self.line_shift}',
                 )
             elif name == "__TIME__":
                 token = Token(
@@ -420,7 +440,34 @@ class Preprocessor(Lexer):
         return args
 
     def skipGroup(self):
-        """用于条件预处理器跳过块"""
+        """用于条件预处理器跳过块
+
+        直接在文本中查找行首的预处理指令, 不对跳过的部分进行词法分析,
+        停在结束该块的指令的'#'处
+        """
+        if self.nexttk_index < len(self.tokens) or self.headerpp:
+            # 已经读到了后面的token, 只能逐个token跳过
+            return self.skipGroupByToken()
+        level = 1
+        for match in skip_pattern.finditer(self.text, self.nextindex):
+            if match.group(1) == None:  # 注释或字符(串)
+                continue
+            keyword = match.group(2)
+            if keyword in ("ifdef", "ifndef", "if"):
+                level += 1
+            elif keyword in ("elif", "elifdef", "elifndef") and level == 1:
+                break
+            elif keyword == "endif":
+                level -= 1
+                if level == 0:
+                    break
+        else:
+            self.nextindex = len(self.text)
+            return
+        self.nextindex = match.start(1)
+
+    def skipGroupByToken(self):
+        """逐个token跳过块"""
         self.state.append(PPState.SKIPPINGGROUP)
         level = 1
         while True:
@@ -430,12 +477,11 @@ class Preprocessor(Lexer):
                 token = self.next()
                 if token.kind in (TokenKind.IFDEF, TokenKind.IFNDEF, TokenKind.IF):
                     level += 1
-                elif token.kind in (
-                    TokenKind.ELIF,
-                    TokenKind.ELIFDEF,
-                    TokenKind.ELIFNDEF,
-                    TokenKind.ENDIF,
-                ):
+                elif (
+                    token.kind
+                    in (TokenKind.ELIF, TokenKind.ELIFDEF, TokenKind.ELIFNDEF)
+                    and level == 1
+                ) or token.kind == TokenKind.ENDIF:
                     level -= 1
                     if level == 0:
                         self.back()  # 预处理指令
@@ -445,14 +491,32 @@ class Preprocessor(Lexer):
                 break
         self.state.pop()
 
-    def include(self, filename, include_path) -> "Preprocessor":
-        """包含一个文件并返回这个文件的预处理器"""
+    def findInclude(self, filename, include_path) -> Optional[str]:
+        """在包含文件查找路径中查找文件, 找不到时返回None"""
         for path in include_path:
             filepath = os.path.join(path, filename)
-            if not os.path.exists(filepath):
-                continue
-            reader = FileReader(filepath)
-            pp = Preprocessor(reader)
-            pp.macros = self.macros
-            return pp
+            if os.path.exists(filepath):
+                return filepath
         return None
+
+    def skipInclude(self, filepath: str) -> bool:
+        """判断包含文件是否可以直接跳过, 即使用了"#pragma once"或者保护宏已经定义"""
+        realpath = os.path.realpath(filepath)
+        if realpath in self.once_files:
+            return True
+        stat = os.stat(realpath)
+        guard = Preprocessor.include_guards.get(realpath)
+        if guard == None or guard[:2] != (stat.st_mtime_ns, stat.st_size):
+            text = SourceCache.get(realpath, check=True)[1]
+            guard = (stat.st_mtime_ns, stat.st_size, detect_include_guard(text))
+            Preprocessor.include_guards[realpath] = guard
+        return guard[2] != None and guard[2] in self.macros
+
+    def include(self, filepath: str) -> "Preprocessor":
+        """包含一个文件并返回这个文件的预处理器"""
+        reader = FileReader(filepath)
+        pp = Preprocessor(reader)
+        pp.macros = self.macros
+        pp.once_files = self.once_files
+        pp.streaming = self.streaming
+        return pp
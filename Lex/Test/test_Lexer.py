@@ -94,7 +94,7 @@ def test_stringchar():
                 },
                 {
                     "kind": TokenKind.STRINGLITERAL,
-                    "content": "\xabc\n\t\f",
+                    "content": "\u0abc\n\t\f",
                     "prefix": "L",
                 },
                 {"kind": TokenKind.END},
@@ -136,3 +136,53 @@ def test_number():
         }
     ]
     examplestest(examples)
+
+
+def test_comment():
+    examples = [
+        {
+            "filename": "comment.txt",
+            "tokens": [
+                {"kind": TokenKind.STRINGLITERAL, "content": "a//b"},
+                {"kind": TokenKind.IDENTIFIER, "text": "l"},
+                {"kind": TokenKind.SLASH},
+                {"kind": TokenKind.END},
+            ],
+        }
+    ]
+    examplestest(examples)
+
+
+def test_munch():
+    examples = [
+        {
+            "filename": "munch.txt",
+            "tokens": [
+                {"kind": TokenKind.PERIOD},
+                {"kind": TokenKind.PERIOD},
+                {"kind": TokenKind.LESSLESSEQUAL},
+                {"kind": TokenKind.GREATERGREATEREQUAL},
+                {"kind": TokenKind.ARROW},
+                {"kind": TokenKind.UNKOWN, "text": "@"},
+                {"kind": TokenKind.MINUSMINUS},
+                {"kind": TokenKind.ELLIPSIS},
+                {"kind": TokenKind.END},
+            ],
+        }
+    ]
+    examplestest(examples)
+
+
+def test_escape():
+    reader = FileReader(os.path.join(os.path.dirname(__file__), "escape.txt"))
+    lexer = Lexer(reader)
+    tokens = [lexer.next() for _ in range(6)]
+    assert [token.content for token in tokens[:4]] == [
+        "\0",
+        "ABé",
+        "\U00010000",
+        "￿",
+    ]
+    for token in tokens[4:]:
+        with pytest.raises(Error):
+            token.content
@@ -0,0 +1,103 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import io
+from argparse import Namespace
+
+from Basic import TokenKind, FileReader
+from Lex import MacroStats, Preprocessor
+from Lex.Macro import Macro
+
+text = """#define ONE 1
+#define A B
+#define B C
+#define C ONE
+#define ADD(x, y) ((x) + (y))
+#define CAT(x, y) x ## y
+int a = A + ADD(ONE, ADD(2, ONE));
+int CAT(b, 1) = __LINE__;
+"""
+
+
+def test_macro_stats():
+    replaceMacro = Preprocessor.replaceMacro
+    concat = Macro.concat
+    stats = MacroStats()
+    stats.instrument()
+    try:
+        pp = Preprocessor(FileReader("macro.c", text))
+        token = pp.next()
+        while token.kind != TokenKind.END:
+            token = pp.next()
+    finally:
+        stats.restore_methods()
+    assert Preprocessor.replaceMacro is replaceMacro
+    assert Macro.concat is concat
+
+    macros = stats.macros
+    assert [(i, macros[i].expansions, macros[i].depth) for i in "ABC"] == [
+        ("A", 1, 1),
+        ("B", 1, 2),
+        ("C", 1, 3),
+    ]
+    # 一次来自A的重新扫描, 两次来自ADD的实参
+    assert macros["ONE"].expansions == 3
+    assert macros["ONE"].depth == 4
+    assert macros["ONE"].tokens == 3
+    assert macros["ADD"].expansions == 2
+    assert macros["ADD"].depth == 1
+    assert macros["ADD"].tokens == 9 + 17  # 外层的展开结果包含内层的9个token
+    assert macros["ADD"].args_seconds > 0
+    assert macros["ADD"].seconds >= macros["ADD"].args_seconds
+    assert macros["CAT"].tokens == 1 and macros["CAT"].concat_seconds > 0
+    assert macros["__LINE__"].tokens == 1
+
+    output = io.StringIO()
+    stats.dump(3, output)
+    assert len(output.getvalue().splitlines()) == 2 + 3
+    merged = MacroStats()
+    merged.merge(stats.to_dict())
+    merged.merge(stats.to_dict())
+    assert merged.macros["ONE"].expansions == 6
+    assert merged.macros["ONE"].depth == 4
+
+
+def test_nested_arguments():
+    stats = MacroStats()
+    stats.instrument()
+    try:
+        nested = text + "int c = ADD(ADD(ADD(ADD(1,2),3),4),5);\n"
+        pp = Preprocessor(FileReader("nested.c", nested))
+        token = pp.next()
+        while token.kind != TokenKind.END:
+            token = pp.next()
+    finally:
+        stats.restore_methods()
+    # 实参中嵌套的展开已经计入了最外层的用时
+    add = stats.macros["ADD"]
+    assert add.expansions == 2 + 4
+    assert add.args_seconds <= add.seconds
+
+
+def test_all_profilers():
+    import Main
+
+    methods = [
+        Preprocessor.replaceMacro,
+        Preprocessor.getMacroArgs,
+        Preprocessor.getNewToken,
+        Macro.concat,
+    ]
+    args = Namespace(ftime_report="text", rule_stats=20, macro_stats=20)
+    for _ in range(2):
+        profilers = Main.start_profiling(args)
+        assert all(profiler != None for profiler in profilers)
+        Main.stop_profiling(*profilers)
+        assert [
+            Preprocessor.replaceMacro,
+            Preprocessor.getMacroArgs,
+            Preprocessor.getNewToken,
+            Macro.concat,
+        ] == methods
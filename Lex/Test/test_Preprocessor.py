@@ -7,6 +7,7 @@ import pytest
 
 from Basic import TokenKind, FileReader, Error
 from Lex import Preprocessor
+from Lex.Preprocessor import detect_include_guard
 
 
 def examplestest(examples, handle=None):
@@ -46,7 +47,7 @@ def test_stringconcat():
             "tokens": [
                 {
                     "kind": TokenKind.STRINGLITERAL,
-                    "content": '1abab1我的世界Minecraft\123"fdas\xabc\n\t\f',
+                    "content": '1abab1我的世界Minecraft\123"fdas\u0abc\n\t\f',
                     "prefix": "U",
                 },
                 {"kind": TokenKind.END},
@@ -198,3 +199,51 @@ def test_conditional():
         }
     ]
     examplestest(examples)
+
+
+def test_skip():
+    examples = [
+        {
+            "filename": "skip.txt",
+            "tokens": [
+                {"kind": TokenKind.INTCONST, "text": "3"},
+                {"kind": TokenKind.INTCONST, "text": "4"},
+                {"kind": TokenKind.END},
+            ],
+        }
+    ]
+    examplestest(examples)
+
+
+def test_include_once():
+    def set_include_path(pp):
+        Preprocessor.include_path = [os.path.dirname(__file__)]
+        return pp
+
+    examples = [
+        {
+            "filename": "include.txt",
+            "tokens": [
+                {"kind": TokenKind.INT},
+                {"kind": TokenKind.IDENTIFIER, "text": "a"},
+                {"kind": TokenKind.SEMI},
+                {"kind": TokenKind.INT},
+                {"kind": TokenKind.IDENTIFIER, "text": "b"},
+                {"kind": TokenKind.SEMI},
+                {"kind": TokenKind.END},
+            ],
+        }
+    ]
+    try:
+        examplestest(examples, set_include_path)
+    finally:
+        Preprocessor.include_path = []
+    guarded = os.path.realpath(os.path.join(os.path.dirname(__file__), "guarded.txt"))
+    assert Preprocessor.include_guards[guarded][2] == "GUARDED_H"
+
+
+def test_detect_include_guard():
+    assert detect_include_guard("#ifndef A\n#define A\nint a;\n#endif\n") == "A"
+    assert detect_include_guard("#ifndef A\n#define A\n#else\n#endif\n") == None
+    assert detect_include_guard("#ifndef A\n#define A\n#endif\nint a;\n") == None
+    assert detect_include_guard("int a;\n#ifndef A\n#define A\n#endif\n") == None
@@ -0,0 +1,75 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from Basic import TokenKind, FileReader, SourceCache
+from Lex import Preprocessor
+
+
+def test_source_cache(tmp_path):
+    filenames = []
+    for i in range(3):
+        filename = str(tmp_path / f"{i}.txt")
+        with open(filename, "w") as file:
+            file.write(f"int a{i};\n" * 10)
+        filenames.append(filename)
+
+    capacity = SourceCache.capacity
+    try:
+        SourceCache.capacity = 200
+        lexers = []
+        for filename in filenames:
+            lexer = Preprocessor(FileReader(filename))
+            while lexer.next().kind != TokenKind.END:
+                pass
+            lexers.append(lexer)
+        # 最早打开的文件被淘汰, 但仍然能够通过位置得到行列, 不需要重新读取
+        assert os.path.realpath(filenames[0]) not in SourceCache.entries
+        assert SourceCache.size <= SourceCache.capacity
+        token = lexers[0].tokens[4]
+        assert str(token.location) == f"<{filenames[0]}:(2,5,2)>"
+        assert os.path.realpath(filenames[0]) not in SourceCache.entries
+
+        # 文件被修改后重新读取
+        with open(filenames[0], "w") as file:
+            file.write("int b;\n")
+        assert FileReader(filenames[0]).text == "int b;\n"
+    finally:
+        SourceCache.capacity = capacity
+
+
+def test_pinned_content(tmp_path):
+    filename = str(tmp_path / "b.c")
+    with open(filename, "w") as file:
+        file.write("int x;\nint y;\n")
+    lexer = Preprocessor(FileReader(filename))
+    while lexer.next().kind != TokenKind.END:
+        pass
+    token = lexer.tokens[4]
+    assert token.text == "y" and str(token.location) == f"<{filename}:(2,5,1)>"
+
+    # 文件被修改并且从缓存中淘汰后, 位置仍然按照词法分析时的内容计算行列
+    with open(filename, "w") as file:
+        file.write("/* comment */\nint x;\nint y;\n")
+    SourceCache.clear()
+    assert str(token.location) == f"<{filename}:(2,5,1)>"
+    # 内容不同的同名文件不会合并成同一个文件编号
+    reader = FileReader(filename)
+    assert reader.file_id != token.location.file_id
+    assert str(reader.location(25)) == f"<{filename}:(3,5,1)>"
+    os.remove(filename)
+    assert list(token.location)[0]["lineno"] == 2
+
+
+def test_newline(tmp_path):
+    filename = str(tmp_path / "crlf.txt")
+    with open(filename, "wb") as file:
+        file.write("int 我的世界;\r\nchar *s = \"\\\r\n\";\n".encode("utf-8") * 100)
+    _, text, line_starts = SourceCache.read(os.path.realpath(filename))
+    # 与文本模式读取时一样统一换行符
+    assert "\r" not in text and len(line_starts) == 300
+    lexer = Preprocessor(FileReader(filename))
+    while lexer.next().kind != TokenKind.END:
+        pass
+    assert lexer.tokens[-2].location.lineno == 300
@@ -0,0 +1,103 @@
+import sys
+import os
+import shutil
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from Basic import TokenKind, FileReader
+from Lex import Lexer, Preprocessor
+from Lex.Lexer import lexeme_groups
+from Lex.TokenCache import TokenCache
+
+
+def lex(filename, lexer_class=Lexer):
+    lexer = lexer_class(FileReader(filename))
+    while lexer.next().kind != TokenKind.END:
+        pass
+    return [(token.kind, token.text, str(token.location)) for token in lexer.tokens]
+
+
+def test_token_cache(tmp_path):
+    filename = str(tmp_path / "number.txt")
+    shutil.copy(os.path.join(os.path.dirname(__file__), "number.txt"), filename)
+    with open(filename, "a", encoding="utf-8") as file:
+        file.write('"a\\x41" /* comment */ <<= ...\n')
+    cache = TokenCache(str(tmp_path / "cache"))
+    expected = lex(filename)
+    expected_pp = lex(filename, Preprocessor)  # 不使用缓存的结果
+    try:
+        Lexer.token_cache = cache
+        assert lex(filename) == expected  # 生成缓存
+        text = FileReader(filename).text
+        assert cache.load(filename, text, lexeme_groups) != None
+        assert lex(filename) == expected  # 使用缓存
+        assert lex(filename, Preprocessor) == expected_pp
+
+        # 只修改了时间, 内容的哈希值不变
+        stat = os.stat(filename)
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert cache.load(filename, text, lexeme_groups) != None
+
+        # 修改了内容
+        with open(filename, "a", encoding="utf-8") as file:
+            file.write("x\n")
+        text = FileReader(filename).text
+        assert cache.load(filename, text, lexeme_groups) == None
+        assert lex(filename)[-2][:2] == (TokenKind.IDENTIFIER, "x")
+        assert cache.load(filename, text, lexeme_groups) != None
+    finally:
+        Lexer.token_cache = None
+
+
+def test_token_cache_buffer(tmp_path):
+    filename = str(tmp_path / "a.c")
+    with open(filename, "w", encoding="utf-8") as file:
+        file.write("int x = 1; int y = 2;\n")
+    cache = TokenCache(str(tmp_path / "cache"))
+    try:
+        Lexer.token_cache = cache
+        lex(filename)
+        # 编辑器中的缓冲区与磁盘上的文件的修改时间和大小无关, 不能使用磁盘上的文件的缓存
+        text = "int zzzzzzzz = 1;\nint y = 2;\n"
+        lexer = Lexer(FileReader(filename, text))
+        while lexer.next().kind != TokenKind.END:
+            pass
+        assert [token.text for token in lexer.tokens[:-1]] == (
+            "int zzzzzzzz = 1 ; int y = 2 ;".split()
+        )
+        # 即使修改时间和大小都相同, 内容不同时缓存也无效
+        same_size = text.replace("zzzzzzzz", "x")
+        assert cache.load(filename, same_size, lexeme_groups) == None
+        assert lex(filename)[1][1] == "x"
+    finally:
+        Lexer.token_cache = None
+
+
+def test_token_cache_invalid(tmp_path):
+    filename = str(tmp_path / "a.c")
+    with open(filename, "w", encoding="utf-8") as file:
+        file.write("int x = 1;\n")
+    text = FileReader(filename).text
+    cache = TokenCache(str(tmp_path / "cache"))
+    lexemes = {0: (lexeme_groups[0], 3, "int")}
+    groups = lexeme_groups[::-1]  # 另一个版本的词法规则写入的缓存
+    cache.save(filename, text, groups, lexemes)
+    assert cache.load(filename, text, groups) == lexemes
+    assert cache.load(filename, text, lexeme_groups) == None
+    try:
+        Lexer.token_cache = cache
+        assert [i[1] for i in lex(filename)] == ["int", "x", "=", "1", ";", ""]
+    finally:
+        Lexer.token_cache = None
+
+    # 损坏的缓存视为不存在
+    path = cache.path(filename)
+    with open(path, "rb") as file:
+        data = bytearray(file.read())
+    for content in (
+        data[:-1],
+        data[: TokenCache.header.size] + b"\xff" * (len(data) - TokenCache.header.size),
+    ):
+        with open(path, "wb") as file:
+            file.write(content)
+        assert cache.load(filename, text, lexeme_groups) == None
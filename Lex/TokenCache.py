@@ -0,0 +1,152 @@
+import os
+import struct
+import hashlib
+from array import array
+from typing import Optional
+
+
+class TokenCache:
+    """词素的磁盘缓存
+
+    每个源文件对应一个缓存文件, 以文件的绝对路径命名, 文件头中记录了源文件的
+    修改时间, 大小和内容的哈希值. 只有内容的哈希值与正在分析的文本相同时缓存才有效,
+    修改时间和大小不能说明正在分析的文本就是磁盘上的文件.
+    词素的分组以编号保存, 因此文件头中还记录了分组列表的哈希值,
+    词法规则改变后旧的缓存不再有效
+    缓存内容依次为: 字符串表, 每个词素的分组编号, 起止偏移和文本在字符串表中的编号
+    """
+
+    magic = b"CMMLEX\x02\x00"
+    # 魔数, 修改时间, 大小, 哈希值, 分组列表的哈希值, 字符串数量, 字符串表字节数, 词素数量
+    header = struct.Struct("<8sqQ20s20sIII")
+
+    def __init__(self, directory: str):
+        self.directory = directory  # 缓存文件所在的目录
+
+    def path(self, filename: str) -> str:
+        """返回源文件对应的缓存文件的路径"""
+        key = hashlib.sha1(os.path.abspath(filename).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key + ".lex")
+
+    @staticmethod
+    def digest(text: str) -> bytes:
+        return hashlib.sha1(text.encode("utf-8", "surrogatepass")).digest()
+
+    @staticmethod
+    def groups_digest(groups: list[str]) -> bytes:
+        return TokenCache.digest("\0".join(groups))
+
+    def load(
+        self, filename: str, text: str, groups: list[str]
+    ) -> Optional[dict[int, tuple[str, int, str]]]:
+        """读取缓存, 返回起始偏移到(分组, 结束偏移, 文本)的映射, 缓存无效时返回None"""
+        try:
+            with open(self.path(filename), "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        if len(data) < self.header.size:
+            return None
+        (
+            magic,
+            mtime,
+            size,
+            digest,
+            groups_digest,
+            string_num,
+            blob_size,
+            lexeme_num,
+        ) = self.header.unpack_from(data)
+        if magic != self.magic:
+            return None
+        if digest != self.digest(text) or groups_digest != self.groups_digest(groups):
+            return None
+        try:
+            return self.decode(data, string_num, blob_size, lexeme_num, groups)
+        except (ValueError, IndexError):  # 文件损坏, 包括UnicodeDecodeError
+            return None
+
+    def decode(
+        self,
+        data: bytes,
+        string_num: int,
+        blob_size: int,
+        lexeme_num: int,
+        groups: list[str],
+    ) -> Optional[dict[int, tuple[str, int, str]]]:
+        """解析文件头之后的内容"""
+        view = memoryview(data)
+        pos = self.header.size
+
+        def read_array(typecode: str, n: int) -> array:
+            nonlocal pos
+            a = array(typecode)
+            a.frombytes(view[pos : pos + n * a.itemsize])
+            pos += n * a.itemsize
+            return a
+
+        lengths = read_array("I", string_num)
+        blob = bytes(view[pos : pos + blob_size]).decode("utf-8", "surrogatepass")
+        pos += blob_size
+        strings: list[str] = []
+        i = 0
+        for length in lengths:
+            strings.append(blob[i : i + length])
+            i += length
+        kinds = read_array("B", lexeme_num)
+        begins = read_array("I", lexeme_num)
+        ends = read_array("I", lexeme_num)
+        text_ids = read_array("I", lexeme_num)
+        if pos != len(data):
+            return None
+        return dict(
+            zip(
+                begins,
+                zip(
+                    map(groups.__getitem__, kinds),
+                    ends,
+                    map(strings.__getitem__, text_ids),
+                ),
+            )
+        )
+
+    def save(
+        self,
+        filename: str,
+        text: str,
+        groups: list[str],
+        lexemes: dict[int, tuple[str, int, str]],
+    ):
+        """将词素写入缓存"""
+        string_ids: dict[str, int] = {}
+        group_ids = {group: i for i, group in enumerate(groups)}
+        kinds, begins, ends, text_ids = array("B"), array("I"), array("I"), array("I")
+        for begin, (group, end, lexeme) in lexemes.items():
+            kinds.append(group_ids[group])
+            begins.append(begin)
+            ends.append(end)
+            text_ids.append(string_ids.setdefault(lexeme, len(string_ids)))
+        lengths = array("I", map(len, string_ids))
+        blob = "".join(string_ids).encode("utf-8", "surrogatepass")
+        try:
+            stat = os.stat(filename)
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path(filename)
+            with open(path + ".tmp", "wb") as file:
+                file.write(
+                    self.header.pack(
+                        self.magic,
+                        stat.st_mtime_ns,
+                        stat.st_size,
+                        self.digest(text),
+                        self.groups_digest(groups),
+                        len(string_ids),
+                        len(blob),
+                        len(kinds),
+                    )
+                )
+                for data in (lengths, blob, kinds, begins, ends, text_ids):
+                    file.write(data if isinstance(data, bytes) else data.tobytes())
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass  # 缓存写入失败不影响编译
@@ -1,4 +1,6 @@
 """词法分析模块"""
 
 from Lex.Lexer import Lexer
+from Lex.MacroStats import MacroStats
 from Lex.Preprocessor import Preprocessor
+from Lex.TokenCache import TokenCache
@@ -1,41 +1,341 @@
+import io
+import os
+import sys
+import json
+import shlex
+import time
 import colorama
-from argparse import ArgumentParser
+from argparse import ArgumentParser, Namespace
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext, redirect_stdout
 from AST import DumpVisitor
-from Basic import Error, FileReader, Diagnostics
-from Lex import Preprocessor
-from Parse import Parser, generate_diagnostic
+from Basic import Diagnostic, Error, FileReader, Diagnostics, Location
+from Basic import DiagnosticKind, TimeReport, deep_recursion
+from Lex import Lexer, MacroStats, Preprocessor, TokenCache
+from Parse import Parser, ParallelParser, PCH, RuleStats, generate_diagnostic
 
 version = "1.0.0"
 
 colorama.init(autoreset=True)
 
 
+def configure(args: Namespace):
+    """根据命令行参数设置全局的选项, 批处理时在每个工作进程中调用"""
+    if args.token_cache != None:
+        Lexer.token_cache = TokenCache(args.token_cache)
+
+
+def instrument(report: TimeReport):
+    """让-ftime-report统计在其他模块内部进行的阶段"""
+    report.instrument(FileReader, "__init__", "读取文件")
+    report.instrument(Preprocessor, "getNewToken", "预处理")
+    report.instrument(Preprocessor, "handleDirective", "预处理")
+    report.instrument(Preprocessor, "replaceMacro", "宏展开")
+
+
+def start_profiling(args: Namespace) -> tuple[TimeReport, RuleStats, MacroStats]:
+    """根据-ftime-report, -rule-stats和-macro-stats开始统计, 未开启的统计为None"""
+    report = stats = macro_stats = None
+    if args.ftime_report != None:
+        report = TimeReport()
+        instrument(report)
+    if args.rule_stats != None:
+        stats = RuleStats()
+        stats.instrument()
+    if args.macro_stats != None:
+        macro_stats = MacroStats()
+        macro_stats.instrument()
+    return report, stats, macro_stats
+
+
+def stop_profiling(report: TimeReport, stats: RuleStats, macro_stats: MacroStats):
+    """按与start_profiling相反的顺序恢复被替换的方法, 同一个方法可能被多次替换"""
+    if macro_stats != None:
+        macro_stats.restore_methods()
+    if stats != None:
+        stats.restore_methods()
+    if report != None:
+        report.restore()
+
+
+def phase(report: TimeReport, name: str):
+    return report.phase(name) if report != None else nullcontext()
+
+
+@deep_recursion
+def compile_file(
+    filename: str,
+    args: Namespace,
+    report: TimeReport = None,
+    stats: RuleStats = None,
+):
+    """处理一个源代码文件, 出错时抛出Error或者Diagnostics
+
+    report不为None时统计各阶段, stats不为None时合并-parallel的工作进程中的规则统计
+    """
+    reader = FileReader(filename)
+    lexer = Preprocessor(reader)
+    # 不需要完整的token序列时, 只保留尚未确认的token
+    lexer.streaming = not (args.dump_tokens or args.emit_pch != None)
+
+    if args.parallel:
+        parser = ParallelParser(
+            lexer, packrat=args.packrat, jobs=args.jobs, rule_stats=stats
+        )
+    else:
+        parser = Parser(lexer, packrat=args.packrat, record_call_tree=False)
+    pch = None
+    if args.include_pch != None:
+        with phase(report, "载入预编译头"):
+            pch = PCH.load(args.include_pch)
+            pch.apply(lexer, parser)
+    with phase(report, "语法分析"):
+        ast = parser.start()
+    if ast != None and pch != None:
+        ast.body = pch.body + ast.body
+
+    if args.dump_tokens:
+        with phase(report, "输出tokens"):
+            for token in (pch.tokens if pch != None else []) + lexer.tokens:
+                print(token)
+    if ast != None and args.emit_pch != None:
+        with phase(report, "保存预编译头"):
+            PCH.create(lexer, parser, ast).save(args.emit_pch)
+    if ast == None:
+        with phase(report, "生成诊断信息"):
+            diagnostics = generate_diagnostic(parser.call_tree)
+        # parser.call_tree.print()
+        raise diagnostics
+    if args.dump_ast and ast != None:
+        with phase(report, "输出AST"):
+            ast.accept(DumpVisitor())
+
+
+def read_manifest(filename: str) -> list[tuple[str, str, list[str]]]:
+    """读取compile_commands.json格式的清单, 返回每项的(文件, 工作目录, 包含文件查找路径)"""
+    try:
+        with open(filename, encoding="utf-8") as file:
+            entries = json.load(file)
+    except (OSError, ValueError):
+        raise Error(f"无法读取清单: {filename}", Location())
+    jobs = []
+    for entry in entries:
+        directory = entry.get("directory", os.path.dirname(os.path.abspath(filename)))
+        arguments = entry.get("arguments")
+        if arguments == None:
+            arguments = shlex.split(entry.get("command", ""))
+        include_path = []
+        for i, arg in enumerate(arguments):
+            if arg == "-I" and i + 1 < len(arguments):
+                include_path.append(os.path.join(directory, arguments[i + 1]))
+            elif arg.startswith("-I") and arg != "-I":
+                include_path.append(os.path.join(directory, arg[2:]))
+        jobs.append((os.path.join(directory, entry["file"]), directory, include_path))
+    return jobs
+
+
+def run_job(
+    filename: str, directory: str, include_path: list[str], args: Namespace
+) -> tuple[str, int, float, tuple[Optional[dict], ...]]:
+    """在工作进程中处理一个文件
+
+    返回输出的内容(包括诊断信息), 诊断信息的数量, 用时(秒)
+    以及-ftime-report, -rule-stats和-macro-stats的统计结果
+    诊断信息在工作进程中输出, 之后注销这个文件用到的源文件,
+    因此工作进程保留的源文件内容只受SourceCache的容量限制, 不随文件数量增长
+    """
+    cwd = os.getcwd()
+    output = io.StringIO()
+    diagnostics = []
+    mark = len(Location.files)
+    report, stats, macro_stats = start_profiling(args)
+    begin = time.perf_counter()
+    with redirect_stdout(output):
+        try:
+            os.chdir(directory)
+            Preprocessor.include_path = include_path
+            compile_file(filename, args, report, stats)
+        except Error as e:
+            diagnostics = [e]
+        except Diagnostics as e:
+            diagnostics = e.list
+        except Exception as e:  # 例如文件不是UTF-8编码或者没有权限, 只让这一个文件失败
+            diagnostics = [
+                Error(f"无法处理{filename}: {type(e).__name__}: {e}", Location())
+            ]
+        finally:
+            os.chdir(cwd)
+            stop_profiling(report, stats, macro_stats)
+        seconds = time.perf_counter() - begin
+        for i in diagnostics:
+            i.dump()
+    Location.release(mark)
+    return (
+        output.getvalue(),
+        len(diagnostics),
+        seconds,
+        (
+            report.to_dict() if report != None else None,
+            stats.to_dict() if stats != None else None,
+            macro_stats.to_dict() if macro_stats != None else None,
+        ),
+    )
+
+
+def batch(jobs: list[tuple[str, str, list[str]]], args: Namespace):
+    """用多个进程处理多个文件, 按输入的顺序输出结果以及每个文件的用时"""
+    begin = time.perf_counter()
+    timing = []
+    # 所有文件的-ftime-report, -rule-stats和-macro-stats统计结果之和
+    report, stats, macro_stats = TimeReport(), RuleStats(), MacroStats()
+    with ProcessPoolExecutor(
+        max_workers=args.jobs, initializer=configure, initargs=(args,)
+    ) as executor:
+        results = executor.map(run_job, *zip(*jobs), [args] * len(jobs))
+        for (filename, _, _), (output, errors, seconds, profile) in zip(
+            jobs, results
+        ):
+            print(output, end="")
+            timing.append((filename, seconds, errors))
+            if profile[0] != None:
+                report.merge(profile[0])
+            if profile[1] != None:
+                stats.merge(profile[1])
+            if profile[2] != None:
+                macro_stats.merge(profile[2])
+    for filename, seconds, errors in timing:
+        status = f"{errors} 个错误" if errors else "成功"
+        print(f"{seconds * 1000:10.1f} ms  {filename} ({status})", file=sys.stderr)
+    print(
+        f"{time.perf_counter() - begin:10.3f} s   共{len(jobs)}个文件", file=sys.stderr
+    )
+    if args.ftime_report != None:
+        report.dump(args.ftime_report)
+    if args.rule_stats != None:
+        stats.dump(args.rule_stats)
+    if args.macro_stats != None:
+        macro_stats.dump(args.macro_stats)
+
+
 def main():
     argparser = ArgumentParser(description=f"c--编译器 {version}")
-    argparser.add_argument("file", help="源代码文件")
+    argparser.add_argument("file", help="源代码文件, 有多个时进行批处理", nargs="*")
     argparser.add_argument(
         "-dump-tokens", help="输出tokens", action="store_true", default=False
     )
     argparser.add_argument(
         "-dump-ast", help="输出AST", action="store_true", default=False
     )
+    argparser.add_argument(
+        "-packrat",
+        help="记忆语法分析的中间结果以避免重复解析",
+        action="store_true",
+        default=False,
+    )
+    argparser.add_argument(
+        "-token-cache",
+        help="将词法分析的结果缓存到指定目录, 文件未改变时直接读取",
+        metavar="DIR",
+        default=None,
+    )
+    argparser.add_argument(
+        "-emit-pch",
+        help="将处理完该文件后的宏, 类型名和语法树保存为预编译头",
+        metavar="FILE",
+        default=None,
+    )
+    argparser.add_argument(
+        "-include-pch",
+        help="在处理源代码文件之前载入预编译头, 文件会被pickle执行, 只能使用可信的文件",
+        metavar="FILE",
+        default=None,
+    )
+    argparser.add_argument(
+        "-I",
+        help="添加包含文件查找路径",
+        metavar="DIR",
+        dest="include_path",
+        action="append",
+        default=[],
+    )
+    argparser.add_argument(
+        "-manifest",
+        help="批处理compile_commands.json格式的清单中的所有文件",
+        metavar="FILE",
+        default=None,
+    )
+    argparser.add_argument(
+        "-parallel",
+        help="将文件切分成各个外部声明, 在多个进程中进行语法分析",
+        action="store_true",
+        default=False,
+    )
+    argparser.add_argument(
+        "-jobs",
+        help="批处理或者-parallel时的进程数, 默认为CPU数量",
+        metavar="N",
+        type=int,
+        default=None,
+    )
+    argparser.add_argument(
+        "-ftime-report",
+        help="在标准错误中输出各阶段的用时和内存, FORMAT为text(默认)或json",
+        metavar="FORMAT",
+        nargs="?",
+        const="text",
+        choices=["text", "json"],
+        default=None,
+    )
+    argparser.add_argument(
+        "-rule-stats",
+        help="在标准错误中输出浪费用时最多的N个语法规则的调用情况(默认20个)",
+        metavar="N",
+        nargs="?",
+        const=20,
+        type=int,
+        default=None,
+    )
+    argparser.add_argument(
+        "-macro-stats",
+        help="在标准错误中输出展开用时最多的N个宏的展开次数, 输出token数和重新扫描深度(默认20个)",
+        metavar="N",
+        nargs="?",
+        const=20,
+        type=int,
+        default=None,
+    )
     args = argparser.parse_args()
+    configure(args)
+    if args.parallel and args.ftime_report != None:
+        Diagnostic(
+            "-parallel时-ftime-report只统计当前进程, 工作进程的用时计入语法分析阶段",
+            Location(),
+            DiagnosticKind.WARNING,
+        ).dump()
     try:
-        reader = FileReader(args.file)
-        lexer = Preprocessor(reader)
-
-        parser = Parser(lexer)
-        ast = parser.start()
-
-        if args.dump_tokens:
-            for token in lexer.tokens:
-                print(token)
-        if ast == None:
-            diagnostics = generate_diagnostic(parser.call_tree)
-            # parser.call_tree.print()
-            raise diagnostics
-        if args.dump_ast and ast != None:
-            ast.accept(DumpVisitor())
+        jobs = [(i, os.getcwd(), args.include_path) for i in args.file]
+        if args.manifest != None:
+            jobs += read_manifest(args.manifest)
+        if not jobs:
+            argparser.error("需要指定源代码文件或者清单")
+        if len(jobs) > 1 or args.manifest != None:
+            if args.emit_pch != None:
+                argparser.error("批处理时不能使用-emit-pch")
+            batch(jobs, args)
+            return
+        Preprocessor.include_path = args.include_path
+        report, stats, macro_stats = start_profiling(args)
+        try:
+            compile_file(jobs[0][0], args, report, stats)
+        finally:
+            stop_profiling(report, stats, macro_stats)
+            if report != None:
+                report.dump(args.ftime_report)
+            if stats != None:
+                stats.dump(args.rule_stats)
+            if macro_stats != None:
+                macro_stats.dump(args.macro_stats)
     except Error as e:
         e.dump()
     except Diagnostics as e:
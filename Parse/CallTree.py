@@ -1,4 +1,4 @@
-from Basic import Token, Error, Diagnostics
+from Basic import Token, Error, Diagnostics, deep_recursion
 
 
 class CallTree:
@@ -36,6 +36,7 @@ class CallTree:
         return Error(f"{self.name}, {self.args}", self.begin_token.location)
 
 
+@deep_recursion
 def generate_diagnostic(self: CallTree) -> Diagnostics:
     """生成诊断信息"""
     mark_calltree(self)
@@ -50,10 +51,10 @@ def _generate_diagnostic(self: CallTree) -> Diagnostics:
 
     for child in self.children:
         if child.mark == True:
-            begin = self.begin_token.location[0]
-            end = child.begin_token.location[0]
+            begin = self.begin_token.location
+            end = child.begin_token.location
             # 忽略了所处文件
-            distance = (end["lineno"] - begin["lineno"], end["col"] - begin["col"])
+            distance = (end.lineno - begin.lineno, end.col - begin.col)
             candidate.append((child, distance))
 
     # 选择推导程度最大并且被标记的节点
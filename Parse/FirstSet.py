@@ -0,0 +1,170 @@
+"""
+各个Parser方法的FIRST集合
+
+方法成功时消耗的第一个token的种类一定在对应的集合中,
+因此当前token不在集合中时可以直接返回None, 不必依次尝试所有的候选式
+集合只需要是真正的FIRST集合的超集, 由Test/test_FirstSet.py在测试用例上检查
+没有列出的方法(包括可能不消耗token的方法)以及以关键字参数调用的方法不进行剪枝
+"""
+
+from Basic import TokenKind
+
+expression_first = frozenset(
+    (
+        TokenKind.IDENTIFIER,
+        TokenKind.INTCONST,
+        TokenKind.FLOATCONST,
+        TokenKind.CHARCONST,
+        TokenKind.STRINGLITERAL,
+        TokenKind.L_PAREN,  # ( expression ), 复合字面量, 类型转换
+        TokenKind._GENERIC,
+        TokenKind.PLUSPLUS,
+        TokenKind.MINUSMINUS,
+        TokenKind.AMP,
+        TokenKind.STAR,
+        TokenKind.PLUS,
+        TokenKind.MINUS,
+        TokenKind.TILDE,
+        TokenKind.EXCLAIM,
+        TokenKind.SIZEOF,
+        TokenKind.ALIGNOF,
+    )
+)
+
+storage_class_specifier_first = frozenset(
+    (
+        TokenKind.AUTO,
+        TokenKind.CONSTEXPR,
+        TokenKind.EXTERN,
+        TokenKind.REGISTER,
+        TokenKind.STATIC,
+        TokenKind.THREAD_LOCAL,
+        TokenKind.TYPEDEF,
+    )
+)
+
+type_specifier_first = frozenset(
+    (
+        TokenKind.VOID,
+        TokenKind.CHAR,
+        TokenKind.SHORT,
+        TokenKind.INT,
+        TokenKind.LONG,
+        TokenKind.FLOAT,
+        TokenKind.DOUBLE,
+        TokenKind.SIGNED,
+        TokenKind.UNSIGNED,
+        TokenKind.BOOL,
+        TokenKind._COMPLEX,
+        TokenKind._DECIMAL32,
+        TokenKind._DECIMAL64,
+        TokenKind._DECIMAL128,
+        TokenKind._BITINT,
+        TokenKind._ATOMIC,
+        TokenKind.STRUCT,
+        TokenKind.UNION,
+        TokenKind.ENUM,
+        TokenKind.IDENTIFIER,  # typedef-name
+        TokenKind.TYPEOF,
+        TokenKind.TYPEOF_UNQUAL,
+    )
+)
+
+type_qualifier_first = frozenset(
+    (TokenKind.CONST, TokenKind.RESTRICT, TokenKind.VOLATILE, TokenKind._ATOMIC)
+)
+
+function_specifier_first = frozenset((TokenKind.INLINE, TokenKind._NORETURN))
+
+type_specifier_qualifier_first = (
+    type_specifier_first | type_qualifier_first | frozenset((TokenKind.ALIGNAS,))
+)
+
+declaration_specifier_first = (
+    storage_class_specifier_first
+    | type_specifier_qualifier_first
+    | function_specifier_first
+)
+
+declaration_first = declaration_specifier_first | frozenset(
+    (TokenKind.L_SQUARE, TokenKind.STATIC_ASSERT)
+)
+
+compound_statement_first = frozenset((TokenKind.L_BRACE,))
+selection_statement_first = frozenset((TokenKind.IF, TokenKind.SWITCH))
+iteration_statement_first = frozenset((TokenKind.WHILE, TokenKind.DO, TokenKind.FOR))
+jump_statement_first = frozenset(
+    (TokenKind.GOTO, TokenKind.CONTINUE, TokenKind.BREAK, TokenKind.RETURN)
+)
+primary_block_first = (
+    compound_statement_first | selection_statement_first | iteration_statement_first
+)
+expression_statement_first = expression_first | frozenset(
+    (TokenKind.SEMI, TokenKind.L_SQUARE)
+)
+label_first = frozenset(
+    (TokenKind.IDENTIFIER, TokenKind.CASE, TokenKind.DEFAULT, TokenKind.L_SQUARE)
+)
+unlabeled_statement_first = (
+    expression_statement_first | primary_block_first | jump_statement_first
+)
+statement_first = label_first | unlabeled_statement_first
+
+first_sets: dict[str, frozenset[TokenKind]] = {
+    # 表达式
+    "primary_expression": expression_first,
+    "generic_selection": frozenset((TokenKind._GENERIC,)),
+    "postfix_expression": expression_first,
+    "compound_literal": frozenset((TokenKind.L_PAREN,)),
+    "unary_expression": expression_first,
+    "cast_expression": expression_first,
+    "binary_expression": expression_first,
+    "multiplicative_expression": expression_first,
+    "additive_expression": expression_first,
+    "shift_expression": expression_first,
+    "relational_expression": expression_first,
+    "equality_expression": expression_first,
+    "AND_expression": expression_first,
+    "exclusive_OR_expression": expression_first,
+    "inclusive_OR_expression": expression_first,
+    "logical_AND_expression": expression_first,
+    "logical_OR_expression": expression_first,
+    "conditional_expression": expression_first,
+    "assignment_expression": expression_first,
+    "expression": expression_first,
+    "constant_expression": expression_first,
+    # 声明
+    "declaration": declaration_first,
+    "declaration_specifiers": declaration_specifier_first,
+    "declaration_specifier": declaration_specifier_first,
+    "storage_class_specifier": storage_class_specifier_first,
+    "type_specifier": type_specifier_first,
+    "type_specifier_qualifier": type_specifier_qualifier_first,
+    "type_qualifier": type_qualifier_first,
+    "function_specifier": function_specifier_first,
+    "struct_or_union_specifier": frozenset((TokenKind.STRUCT, TokenKind.UNION)),
+    "enum_specifier": frozenset((TokenKind.ENUM,)),
+    "atomic_type_specifier": frozenset((TokenKind._ATOMIC,)),
+    "typeof_specifier": frozenset((TokenKind.TYPEOF, TokenKind.TYPEOF_UNQUAL)),
+    "typedef_name": frozenset((TokenKind.IDENTIFIER,)),
+    "alignment_specifier": frozenset((TokenKind.ALIGNAS,)),
+    "static_assert_declaration": frozenset((TokenKind.STATIC_ASSERT,)),
+    "attribute_specifier_sequence": frozenset((TokenKind.L_SQUARE,)),
+    "attribute_specifier": frozenset((TokenKind.L_SQUARE,)),
+    "attribute_declaration": frozenset((TokenKind.L_SQUARE,)),
+    # 语句
+    "statement": statement_first,
+    "unlabeled_statement": unlabeled_statement_first,
+    "primary_block": primary_block_first,
+    "secondary_block": statement_first,
+    "label": label_first,
+    "labeled_statement": label_first,
+    "compound_statement": compound_statement_first,
+    "block_item": declaration_first | statement_first,
+    "expression_statement": expression_statement_first,
+    "selection_statement": selection_statement_first,
+    "iteration_statement": iteration_statement_first,
+    "jump_statement": jump_statement_first,
+    "function_definition": declaration_first,
+    "external_declaration": declaration_first,
+}
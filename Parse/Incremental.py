@@ -0,0 +1,254 @@
+import re
+from typing import Iterable, Optional
+from AST import TranslationUnit
+from Basic import Diagnostics, Error, FileReader, Location, Token, TokenKind, TokenList
+from Basic import deep_recursion
+from Basic.Location import SourceFile
+from Lex import Preprocessor
+from Parse.Parser import Parser
+from Parse.CallTree import generate_diagnostic
+from Parse.TypeSymbol import TypeSymbolTable
+
+identifier_pattern = re.compile(r"[^\W\d]\w*")
+undef_pattern = re.compile(r"^[ \t]*#[ \t]*undef[ \t]+([^\W\d]\w*)", re.MULTILINE)
+predefined_macros = {"__DATE__", "__FILE__", "__LINE__", "__TIME__"}
+
+
+def main_extent(tokens: Iterable[Token], file_id: int) -> Optional[tuple[int, int]]:
+    """tokens全部来自file_id时返回它们覆盖的范围, 否则返回None"""
+    begin = end = None
+    for token in tokens:
+        for span in token.location.spans():
+            if span.file_id != file_id:
+                return None
+            begin = span.begin if begin == None else min(begin, span.begin)
+            end = span.end if end == None else max(end, span.end)
+    return None if begin == None else (begin, end)
+
+
+def shift_locations(tokens: list[Token], file_id: int, offset: int, delta: int):
+    """原地移动tokens中位于file_id且从offset及之后开始的片段
+
+    语法树节点的位置都直接取自token, 与token共享同一个对象, 因此只需要处理token
+    这是位置不可修改的唯一例外: 被移动的位置同时属于之前返回的语法树,
+    复制出新的位置需要复制编辑点之后的全部节点, 会失去增量分析的意义
+    """
+    spans = {
+        id(span): span
+        for token in tokens
+        for span in token.location.spans()
+        if span.file_id == file_id and span.begin >= offset
+    }
+    for span in spans.values():
+        span.begin += delta
+        span.end += delta
+
+
+class IncrementalParser:
+    """增量语法分析器, 文本被编辑后只重新分析受影响的外部声明
+
+    未受影响的外部声明的语法树节点会被直接复用, 其中的位置按编辑移动
+    编辑涉及预处理指令, 宏, 续行或者类型名的变化时退回到完整的分析
+
+    返回的语法树和token归该对象所有, 其中的位置只对当前的文本有效:
+    每次reparse都会原地移动之前返回的语法树中的位置, 文件编号也会对应到新的文本,
+    copy.deepcopy同样不会复制位置. 需要保留编辑前的位置时, 应当在下一次编辑之前
+    把它转换成行列(例如str(location)或list(location))
+    """
+
+    def __init__(self, filename: str, text: str, packrat: bool = False):
+        self.filename = filename
+        self.text = text  # 当前的文本
+        self.packrat = packrat
+        self.file_id = Location.register(SourceFile(filename, text))
+        self.unit: Optional[TranslationUnit] = None  # 当前的语法树, 分析失败时为None
+        self.diagnostics: Optional[Diagnostics] = None  # 分析失败时的诊断信息
+        self.tokens: list[Token] = []  # 预处理后的token序列, 以END结尾
+        # 每个外部声明在tokens中的范围, 为None时下一次只能完整分析
+        self.ranges: Optional[list[tuple[int, int]]] = None
+        # 每个外部声明在文本中的范围, 包含来自其他文件或宏定义的token时为None
+        self.extents: list[Optional[tuple[int, int]]] = []
+        self.type_symbols: list[tuple[str, ...]] = []  # 每个外部声明之前以及最后的类型名
+        self.macro_names: set[str] = set()  # 可能作为宏名的标识符
+        self.full_parses = 0  # 完整分析的次数
+        self.parse()
+
+    def update_source(self):
+        """让文件编号对应新的文本, 编辑点之前的位置因此仍然有效"""
+        Location.files[self.file_id] = SourceFile(self.filename, self.text)
+        Location.file_ids[self.filename] = self.file_id
+
+    @deep_recursion
+    def parse_declarations(self, parser: Parser):
+        """从当前token开始依次分析外部声明直到END
+
+        返回(外部声明, 它们在token序列中的范围, 每个外部声明之前以及最后的类型名), 失败时返回None
+        """
+        body, ranges, type_symbols = [], [], []
+        type_symbol, state = tuple(parser.type_symbol), parser.type_symbol.state
+        while parser.curtoken().kind != TokenKind.END:
+            type_symbols.append(type_symbol)
+            begin = parser.tokengen.save() - 1
+            node = parser.external_declaration()
+            if node == None or parser.tokengen.save() - 1 == begin:
+                return None
+            body.append(node)
+            ranges.append((begin, parser.tokengen.save() - 1))
+            parser.commit()
+            if parser.type_symbol.state != state:
+                type_symbol, state = tuple(parser.type_symbol), parser.type_symbol.state
+        type_symbols.append(type_symbol)
+        return body, ranges, type_symbols
+
+    def parse(self) -> Optional[TranslationUnit]:
+        """完整地分析当前的文本"""
+        self.full_parses += 1
+        self.ranges = None  # 分析中出现错误时, 下一次仍然需要完整分析
+        self.update_source()
+        preprocessor = Preprocessor(FileReader(self.filename, self.text))
+        parser = Parser(preprocessor, packrat=self.packrat, record_call_tree=False)
+        parser.nexttoken()
+        result = self.parse_declarations(parser)
+        self.macro_names = (
+            set(preprocessor.macros)
+            | set(undef_pattern.findall(preprocessor.text))
+            | predefined_macros
+        )
+        if result == None or not result[0]:
+            # 按Parser.start的方式重新分析, 得到相同的结果和诊断信息
+            parser = Parser(
+                Preprocessor(FileReader(self.filename, self.text)),
+                packrat=self.packrat,
+                record_call_tree=False,
+            )
+            self.unit = parser.start()
+            self.diagnostics = (
+                generate_diagnostic(parser.call_tree) if self.unit == None else None
+            )
+            return self.unit
+        body, self.ranges, self.type_symbols = result
+        self.tokens = preprocessor.tokens[: self.ranges[-1][1] + 1]
+        self.extents = [
+            main_extent(self.tokens[begin:end], self.file_id)
+            for begin, end in self.ranges
+        ]
+        self.unit = TranslationUnit(body=body, location=self.tokens[0].location)
+        self.diagnostics = None
+        return self.unit
+
+    def reparse(self, begin: int, end: int, text: str) -> Optional[TranslationUnit]:
+        """将文本中[begin, end)的部分替换为text, 然后返回新的语法树
+
+        只重新分析编辑所在的外部声明, 之后的外部声明复用原来的节点
+        """
+        old_text = self.text
+        self.text = old_text[:begin] + text + old_text[end:]
+        delta = len(text) - (end - begin)
+        if (
+            self.ranges == None
+            or "\\\n" in self.text
+            or "__LINE__" in self.text
+            and old_text.count("\n", begin, end) != text.count("\n")
+        ):
+            return self.parse()
+
+        # 受影响的外部声明为[first, last), 它们之间的文本为[region_begin, region_end)
+        n = len(self.ranges)
+        first, last = 0, n
+        for k, extent in enumerate(self.extents):
+            if extent == None:
+                continue
+            if extent[1] < begin:
+                first = k + 1
+            elif extent[0] > end:
+                last = k
+                break
+        if any(self.extents[k] == None for k in range(first, last)):
+            return self.parse()
+        region_begin = self.extents[first - 1][1] if first > 0 else 0
+        region_end = self.extents[last][0] if last < n else len(old_text)
+        new_region = self.text[region_begin : region_end + delta]
+        if (
+            "#" in old_text[region_begin:region_end]
+            or "#" in new_region
+            or any(
+                name in self.macro_names
+                for name in identifier_pattern.findall(new_region)
+            )
+        ):
+            return self.parse()
+
+        # 重新进行词法分析, 直到与原来下一个外部声明的开头重新对齐
+        self.update_source()
+        preprocessor = Preprocessor(FileReader(self.filename, self.text))
+        preprocessor.nextindex = region_begin
+        stop = region_end + delta
+        tokens = []
+        while True:
+            try:
+                token = preprocessor.next()
+            except Error:  # 由完整的分析报告错误
+                return self.parse()
+            if token.kind == TokenKind.END:
+                if last < n:
+                    return self.parse()
+                end_token = token
+                break
+            extent = main_extent((token,), self.file_id)
+            if extent == None:
+                return self.parse()
+            if extent[0] >= stop:
+                expected = self.tokens[self.ranges[last][0]]
+                if extent[0] != stop or token.text != expected.text:
+                    return self.parse()
+                end_token = Token(TokenKind.END, token.location, "")
+                break
+            tokens.append(token)
+
+        parser = Parser(
+            TokenList(tokens + [end_token]),
+            packrat=self.packrat,
+            record_call_tree=False,
+        )
+        parser.type_symbol = TypeSymbolTable(self.type_symbols[first])
+        parser.nexttoken()
+        result = self.parse_declarations(parser)
+        if (
+            result == None
+            or result[2][-1] != self.type_symbols[last]  # 类型名发生了变化
+            or not result[0] and last - first == n
+        ):
+            return self.parse()
+
+        # 用新的外部声明替换受影响的部分, 并移动之后各部分的位置
+        body, ranges, type_symbols = result
+        token_begin = self.ranges[first][0] if first < n else len(self.tokens) - 1
+        token_end = self.ranges[last][0] if last < n else len(self.tokens)
+        rest_tokens = self.tokens[token_end:]
+        if delta != 0:
+            shift_locations(rest_tokens, self.file_id, end, delta)
+        if last == n:
+            rest_tokens = [end_token]
+        shift = token_begin + len(tokens) - token_end
+        self.tokens = self.tokens[:token_begin] + tokens + rest_tokens
+        self.ranges = (
+            self.ranges[:first]
+            + [(a + token_begin, b + token_begin) for a, b in ranges]
+            + [(a + shift, b + shift) for a, b in self.ranges[last:]]
+        )
+        self.extents = (
+            self.extents[:first]
+            + [main_extent(tokens[a:b], self.file_id) for a, b in ranges]
+            + [
+                None if extent == None else (extent[0] + delta, extent[1] + delta)
+                for extent in self.extents[last:]
+            ]
+        )
+        self.type_symbols = (
+            self.type_symbols[:first] + type_symbols[:-1] + self.type_symbols[last:]
+        )
+        self.unit = TranslationUnit(
+            body=self.unit.body[:first] + body + self.unit.body[last:],
+            location=self.tokens[0].location,
+        )
+        return self.unit
@@ -0,0 +1,108 @@
+import os
+import mmap
+import pickle
+import struct
+import hashlib
+from AST import Node
+from Basic import Error, Location, Token
+from Lex import Preprocessor
+from Lex.Macro import Macro
+from Parse.Parser import Parser
+from Parse.TypeSymbol import TypeSymbolTable
+
+
+class PCH:
+    """预编译头, 保存处理完一个头文件之后预处理器和语法分析器的状态
+
+    文件头之后是pickle序列化的PCH对象, 读取时会执行pickle,
+    因此只能读取自己生成的可信的预编译头
+    """
+
+    magic = b"CMMPCH"
+    version = 2  # 序列化的内容(包括语法树节点等类的定义)改变时增加
+    header = struct.Struct("<6sH")  # 魔数, 版本
+
+    def __init__(
+        self,
+        macros: dict[str, Macro],
+        type_symbol: list[str],
+        tokens: list[Token],
+        body: list[Node],
+    ):
+        self.macros = macros  # 定义的宏
+        self.type_symbol = type_symbol  # 种类为类型的符号
+        self.tokens = tokens  # 预处理后的token序列, 不包括结尾的END
+        self.body = body  # 语法树中的各个外部声明
+        self.once_files: set[str] = set()  # 使用了"#pragma once"的文件
+        # 生成时用到的源文件及其内容的哈希值, 用于检查预编译头是否过期
+        self.dependencies: dict[str, bytes] = {}
+        for token in tokens + [
+            token for macro in macros.values() for token in macro.replacement
+        ]:
+            for span in getattr(token, "location", Location()).spans():
+                source = Location.files[span.file_id]
+                if source.filename not in self.dependencies:
+                    self.dependencies[source.filename] = PCH.digest(source.text)
+
+    @staticmethod
+    def digest(text: str) -> bytes:
+        return hashlib.sha1(text.encode("utf-8", "surrogatepass")).digest()
+
+    @staticmethod
+    def create(preprocessor: Preprocessor, parser: Parser, ast) -> "PCH":
+        """从处理完头文件的预处理器和语法分析器创建预编译头"""
+        pch = PCH(
+            dict(preprocessor.macros),
+            list(parser.type_symbol),
+            preprocessor.tokens[:-1],
+            ast.body,
+        )
+        pch.once_files = set(preprocessor.once_files)
+        return pch
+
+    def save(self, filename: str):
+        with open(filename, "wb") as file:
+            file.write(PCH.header.pack(PCH.magic, PCH.version))
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(filename: str) -> "PCH":
+        """通过内存映射读取预编译头, 文件会被pickle执行, 只能用于可信的文件"""
+        try:
+            with open(filename, "rb") as file:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    if len(data) < PCH.header.size:
+                        raise Error(f"不是有效的预编译头: {filename}", Location())
+                    magic, version = PCH.header.unpack_from(data)
+                    if magic != PCH.magic:
+                        raise Error(f"不是有效的预编译头: {filename}", Location())
+                    if version != PCH.version:
+                        raise Error(
+                            f"预编译头的版本不匹配: {filename}, 需要重新生成", Location()
+                        )
+                    with memoryview(data) as view:
+                        pch: PCH = pickle.loads(view[PCH.header.size :])
+        except (
+            OSError,
+            ValueError,
+            EOFError,
+            pickle.UnpicklingError,
+            AttributeError,
+            ImportError,
+        ):  # 文件被截断或损坏, 或者由类定义不同的版本生成
+            raise Error(f"无法读取预编译头: {filename}", Location())
+        for source_name, digest in pch.dependencies.items():
+            try:
+                with open(source_name, encoding="utf-8") as file:
+                    changed = PCH.digest(file.read()) != digest
+            except OSError:
+                changed = True
+            if changed:
+                raise Error(f"预编译头已过期, {source_name}发生了改变", Location())
+        return pch
+
+    def apply(self, preprocessor: Preprocessor, parser: Parser):
+        """将预编译头中的状态应用到新的预处理器和语法分析器上"""
+        preprocessor.macros.update(self.macros)
+        preprocessor.once_files.update(self.once_files)
+        parser.type_symbol = TypeSymbolTable(self.type_symbol)
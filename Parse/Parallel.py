@@ -0,0 +1,259 @@
+import io
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from AST import Node, TranslationUnit
+from Basic import Location, Token, TokenGen, TokenKind, TokenList, deep_recursion
+from Basic.Location import MultiLocation, SourceFile
+from Parse.Parser import Parser
+from Parse.CallTree import CallTree
+from Parse.RuleStats import RuleStats
+from Parse.TypeSymbol import TypeSymbolTable
+
+
+def split_declarations(tokens: list[Token]) -> list[tuple[int, int, bool]]:
+    """按括号的配对以及分号粗略地把token序列切分成各个外部声明
+
+    返回每部分的(开始, 结束, 是否可能是typedef), 不保证切分正确, 分析失败时需要整体重新分析
+    """
+    chunks = []
+    begin = 0
+    depth = 0  # 括号的嵌套层数
+    body_depth = None  # 函数体的'{'所在的层数
+    has_typedef = has_equal = False
+    for i, token in enumerate(tokens):
+        kind = token.kind
+        if kind == TokenKind.END:
+            break
+        if kind in (TokenKind.L_PAREN, TokenKind.L_SQUARE, TokenKind.L_BRACE):
+            if (
+                kind == TokenKind.L_BRACE
+                and depth == 0
+                and not has_equal
+                and i > begin
+                and tokens[i - 1].kind in (TokenKind.R_PAREN, TokenKind.R_SQUARE)
+            ):  # 声明符之后的'{'是函数体的开始, 初始化器中的复合字面量除外
+                body_depth = depth
+            depth += 1
+        elif kind in (TokenKind.R_PAREN, TokenKind.R_SQUARE, TokenKind.R_BRACE):
+            depth = max(depth - 1, 0)
+            if kind == TokenKind.R_BRACE and depth == body_depth:
+                chunks.append((begin, i + 1, has_typedef))
+                begin = i + 1
+                body_depth = None
+                has_typedef = has_equal = False
+        elif depth == 0:
+            if kind == TokenKind.TYPEDEF:
+                has_typedef = True
+            elif kind == TokenKind.EQUAL:
+                has_equal = True
+            elif kind == TokenKind.SEMI:
+                chunks.append((begin, i + 1, has_typedef))
+                begin = i + 1
+                has_typedef = has_equal = False
+    if begin < len(tokens) and tokens[begin].kind != TokenKind.END:
+        chunks.append((begin, len(tokens) - 1, has_typedef))  # 不完整的部分
+    return chunks
+
+
+class LocationPickler(pickle.Pickler):
+    """序列化时位置只保存各个片段的(文件编号, 起止偏移), 不携带源文件的内容
+
+    源文件在工作进程启动时由init_worker传递一次, file_ids把当前进程的文件编号
+    换成对方进程的文件编号
+    """
+
+    def __init__(self, file, file_ids: dict[int, int]):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.file_ids = file_ids
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Location):
+            return tuple(
+                (self.file_ids[span.file_id], span.begin, span.end)
+                for span in obj.spans()
+            )
+        return None
+
+
+class LocationUnpickler(pickle.Unpickler):
+    def __init__(self, file, file_ids: dict[int, int]):
+        super().__init__(file)
+        self.file_ids = file_ids
+        self.locations: dict[tuple, Location] = {}  # 相同的位置共享同一个对象
+
+    def persistent_load(self, pid: tuple) -> Location:
+        location = self.locations.get(pid)
+        if location == None:
+            spans = tuple(
+                Location(self.file_ids[file_id], begin, end)
+                for file_id, begin, end in pid
+            )
+            if not spans:
+                location = Location()
+            elif len(spans) == 1:
+                location = spans[0]
+            else:
+                location = MultiLocation(spans)
+            self.locations[pid] = location
+        return location
+
+
+def dumps(obj, file_ids: dict[int, int]) -> bytes:
+    file = io.BytesIO()
+    LocationPickler(file, file_ids).dump(obj)
+    return file.getvalue()
+
+
+def loads(data: bytes, file_ids: dict[int, int]):
+    return LocationUnpickler(io.BytesIO(data), file_ids).load()
+
+
+worker_ids: dict[int, int] = {}  # 工作进程中: 主进程的文件编号对应的文件编号
+
+
+def init_worker(sources: dict[int, SourceFile]):
+    """工作进程启动时登记主进程传来的源文件"""
+    worker_ids.clear()
+    for file_id, source in sources.items():
+        worker_ids[file_id] = Location.register(source)
+
+
+@deep_recursion
+def parse_chunk(
+    tokens: list[Token], type_symbol: tuple[str, ...], packrat: bool
+) -> Optional[tuple[list[Node], tuple[str, ...]]]:
+    """分析以END结尾的一部分token, 返回其中的外部声明以及之后的类型名, 失败时返回None"""
+    parser = Parser(TokenList(tokens), packrat=packrat, record_call_tree=False)
+    parser.type_symbol = TypeSymbolTable(type_symbol)
+    parser.nexttoken()
+    body = []
+    while parser.curtoken().kind != TokenKind.END:
+        node = parser.external_declaration()
+        if node == None:
+            return None
+        body.append(node)
+        parser.commit()
+    return body, tuple(parser.type_symbol)
+
+
+def parse_task(
+    data: bytes, packrat: bool, rule_stats: bool
+) -> tuple[bytes, Optional[dict[str, dict]]]:
+    """在工作进程中依次分析多个部分, 类型名发生变化的部分视为失败
+
+    data是用dumps序列化的list[tuple[list[Token], tuple[str, ...]]],
+    返回同样序列化的list[Optional[list[Node]]],
+    rule_stats为True时同时返回工作进程中的RuleStats.to_dict()
+    """
+    task: list[tuple[list[Token], tuple[str, ...]]] = loads(data, worker_ids)
+    stats = None
+    if rule_stats:
+        stats = RuleStats()
+        stats.instrument()
+    result = []
+    try:
+        for tokens, type_symbol in task:
+            ret = parse_chunk(tokens, type_symbol, packrat)
+            result.append(ret[0] if ret != None and ret[1] == type_symbol else None)
+    finally:
+        if stats != None:
+            stats.restore_methods()
+    parent_ids = {file_id: parent for parent, file_id in worker_ids.items()}
+    return dumps(result, parent_ids), stats.to_dict() if stats != None else None
+
+
+class ParallelParser:
+    """先把token序列切分成各个外部声明, 再在多个进程中分别进行语法分析
+
+    可能声明类型名的部分在当前进程中按顺序分析, 以得到其他部分开始时的类型名
+    切分有误或者分析失败时退回到Parser, 以得到相同的结果和诊断信息
+    rule_stats不为None时, 工作进程中的规则统计结果会合并到其中
+    """
+
+    def __init__(
+        self,
+        tokengen: TokenGen,
+        packrat: bool = False,
+        jobs: int = None,
+        rule_stats: RuleStats = None,
+    ):
+        self.tokengen = tokengen
+        self.packrat = packrat
+        self.jobs = jobs if jobs != None else os.cpu_count()  # 进程数
+        self.rule_stats = rule_stats  # 当前进程中的规则统计, 已经instrument
+        self.type_symbol = TypeSymbolTable()  # 种类为类型的符号
+        self.call_tree: CallTree = None  # 退回到Parser并且分析失败时的调用树
+
+    def serial(self, tokens: list[Token]) -> Optional[Node]:
+        """用Parser分析全部token"""
+        parser = Parser(TokenList(tokens), packrat=self.packrat, record_call_tree=False)
+        parser.type_symbol = TypeSymbolTable(self.type_symbol)
+        ast = parser.start()
+        self.type_symbol = parser.type_symbol
+        self.call_tree = parser.call_tree
+        return ast
+
+    def start(self) -> Optional[Node]:
+        tokens = [self.tokengen.next()]
+        while tokens[-1].kind != TokenKind.END:
+            tokens.append(self.tokengen.next())
+        chunks = split_declarations(tokens)
+        if self.jobs <= 1 or len(chunks) <= 1:
+            return self.serial(tokens)
+
+        def chunk_tokens(begin: int, end: int) -> list[Token]:
+            return tokens[begin:end] + [Token(TokenKind.END, tokens[end].location, "")]
+
+        # 在当前进程中分析可能声明类型名的部分, 同时记录其他部分开始时的类型名
+        type_symbol = tuple(self.type_symbol)
+        results: list[Optional[list[Node]]] = []
+        pending: list[tuple[int, tuple[list[Token], tuple[str, ...]]]] = []
+        for begin, end, has_typedef in chunks:
+            if has_typedef:
+                ret = parse_chunk(chunk_tokens(begin, end), type_symbol, self.packrat)
+                if ret == None:
+                    return self.serial(tokens)
+                results.append(ret[0])
+                type_symbol = ret[1]
+            else:
+                pending.append((len(results), (chunk_tokens(begin, end), type_symbol)))
+                results.append(None)
+
+        # 每个进程分到几个任务, 每个任务包含连续的多个部分
+        size = max(len(pending) // (self.jobs * 4), 1)
+        tasks = [pending[i : i + size] for i in range(0, len(pending), size)]
+        # 源文件的内容只在启动每个工作进程时传递一次, 任务和结果中的位置只有文件编号
+        file_ids = {
+            span.file_id: span.file_id
+            for token in tokens
+            for span in token.location.spans()
+        }
+        sources = {file_id: Location.files[file_id] for file_id in file_ids}
+        with ProcessPoolExecutor(
+            max_workers=self.jobs, initializer=init_worker, initargs=(sources,)
+        ) as executor:
+            task_results = list(
+                executor.map(
+                    parse_task,
+                    [dumps([chunk for _, chunk in task], file_ids) for task in tasks],
+                    [self.packrat] * len(tasks),
+                    [self.rule_stats != None] * len(tasks),
+                )
+            )
+        for _, rules in task_results:
+            if rules != None:
+                self.rule_stats.merge(rules)
+        for task, (data, _) in zip(tasks, task_results):
+            task_result: list[Optional[list[Node]]] = loads(data, file_ids)
+            for (index, _), body in zip(task, task_result):
+                if body == None:
+                    return self.serial(tokens)
+                results[index] = body
+
+        self.type_symbol = TypeSymbolTable(type_symbol)
+        body = [node for chunk in results for node in chunk]
+        if not body:
+            return self.serial(tokens)
+        return TranslationUnit(body=body, location=tokens[0].location)
@@ -1,3 +1,4 @@
+from copy import copy
 from typing import Union
 from AST import (
     Node,
@@ -74,26 +75,68 @@ from AST import (
     FunctionDef,
     Stmt,
 )
-from Basic import Diagnostic, Token, TokenGen, TokenKind, Error
+from Basic import Diagnostic, Token, TokenGen, TokenKind, Error, deep_recursion
 from Parse.Wrapper import may_update_type_symbol, may_enter_scope, update_call_tree
 from Parse.CallTree import CallTree
+from Parse.TypeSymbol import TypeSymbolTable
+
+# 二元运算符的(优先级, 种类), 优先级越大结合得越紧
+binary_operator: dict[TokenKind, tuple[int, BinOpKind]] = {
+    TokenKind.STAR: (10, BinOpKind.MUL),
+    TokenKind.SLASH: (10, BinOpKind.DIV),
+    TokenKind.PERCENT: (10, BinOpKind.MOD),
+    TokenKind.PLUS: (9, BinOpKind.ADD),
+    TokenKind.MINUS: (9, BinOpKind.SUB),
+    TokenKind.LESSLESS: (8, BinOpKind.LSHIFT),
+    TokenKind.GREATERGREATER: (8, BinOpKind.RSHIFT),
+    TokenKind.LESS: (7, BinOpKind.LT),
+    TokenKind.GREATER: (7, BinOpKind.GT),
+    TokenKind.LESSEQUAL: (7, BinOpKind.LTE),
+    TokenKind.GREATEREQUAL: (7, BinOpKind.GTE),
+    TokenKind.EQUALEQUAL: (6, BinOpKind.EQ),
+    TokenKind.EXCLAIMEQUAL: (6, BinOpKind.NEQ),
+    TokenKind.AMP: (5, BinOpKind.BITAND),
+    TokenKind.CARET: (4, BinOpKind.BITXOR),
+    TokenKind.PIPE: (3, BinOpKind.BITOR),
+    TokenKind.AMPAMP: (2, BinOpKind.AND),
+    TokenKind.PIPEPIPE: (1, BinOpKind.OR),
+}
 
 
 class Parser:
     """语法分析器"""
 
-    def __init__(self, tokengen: TokenGen):
+    def __init__(
+        self,
+        tokengen: TokenGen,
+        packrat: bool = False,
+        record_call_tree: bool = True,
+        prune: bool = True,
+    ):
         self.tokengen: TokenGen = tokengen
         self.diagnostic: Diagnostic = None
-        self.type_symbol: list[str] = []  # 种类为类型的符号
+        self.type_symbol = TypeSymbolTable()  # 种类为类型的符号
         self.call_tree: CallTree = None  # 调用树
         self.cur_call_tree: CallTree = self.call_tree  # 当前节点
+        # 是否记录调用树, 不记录时只有在解析失败后才会重新解析一遍来生成调用树
+        self.record_call_tree = record_call_tree
+        self.packrat = packrat  # 是否记忆各个方法的解析结果
+        self.memo: dict[tuple, tuple] = {}  # packrat模式下的记忆表
+        self.prune = prune  # 是否按FIRST集合跳过不可能成功的方法
 
     def save(self):
-        return self.tokengen.save()
+        """保存token的位置以及type_symbol的位置, 回溯时一起恢复"""
+        return self.tokengen.save(), self.type_symbol.mark()
 
-    def restore(self, *args, **kwargs):
-        return self.tokengen.restore(*args, **kwargs)
+    def restore(self, state):
+        index, mark = state
+        self.tokengen.restore(index)
+        self.type_symbol.rollback(mark)
+
+    def commit(self):
+        """确认不会再回溯到当前位置之前"""
+        self.tokengen.commit()
+        self.memo.clear()
 
     def curtoken(self):
         return self.tokengen.curtoken()
@@ -101,6 +144,18 @@ class Parser:
     def nexttoken(self):
         return self.tokengen.next()
 
+    def append_declarator(self, head: Declarator, tail: Declarator) -> Declarator:
+        """
+        将tail接到head所在声明符链的末尾
+        链上的节点会被复制, 不会修改head, 因为它可能是被记忆的结果
+        """
+        head = c = copy(head)
+        while c.declarator != None:
+            c.declarator = copy(c.declarator)
+            c = c.declarator
+        c.declarator = tail
+        return head
+
     def lookahead(self, *args):
         z = self.save()
         for i in args:
@@ -521,37 +576,63 @@ class Parser:
         return None
 
     @update_call_tree
-    def multiplicative_expression(self):
+    def binary_expression(self, precedence: int = 1, left: Node = None):
         """
-        multiplicative-expression:
-            cast-expression
-            multiplicative-expression * cast-expression
-            multiplicative-expression / cast-expression
-            multiplicative-expression % cast-expression
+        优先级不低于precedence的二元运算符组成的表达式, 操作数为cast-expression
+        优先级见binary_operator, 运算符都是左结合的
+        left不为None时是已经解析好的第一个操作数
+
+        用运算符栈进行优先级爬升: 遇到优先级不高于栈顶的运算符时先归约栈顶,
+        因此不需要为每个优先级调用一层方法, 得到的语法树与按文法逐层解析时相同
         """
         z = self.save()
-        a = self.cast_expression()
+        a = left if left != None else self.cast_expression()
         if a == None:
             self.restore(z)
             return None
-        token_opkind = {
-            TokenKind.STAR: BinOpKind.MUL,
-            TokenKind.SLASH: BinOpKind.DIV,
-            TokenKind.PERCENT: BinOpKind.MOD,
-        }
-        while self.curtoken().kind in token_opkind.keys():
-            token = self.curtoken()
-            if self.expect(token.kind) and (b := self.cast_expression()):
-                a = BinaryOperator(
-                    op=token_opkind[token.kind],
-                    left=a,
+        operands = [a]
+        operators: list[tuple[int, Token]] = []  # (优先级, 运算符)
+        while (kind := self.curtoken().kind) in binary_operator:
+            level = binary_operator[kind][0]
+            if level < precedence:
+                break
+            while operators and operators[-1][0] >= level:
+                _, token = operators.pop()
+                b = operands.pop()
+                operands[-1] = BinaryOperator(
+                    op=binary_operator[token.kind][1],
+                    left=operands[-1],
                     right=b,
                     location=token.location,
                 )
+            token = self.curtoken()
+            if self.expect(kind) and (b := self.cast_expression()):
+                operators.append((level, token))
+                operands.append(b)
             else:
                 self.restore(z)
                 return None
-        return a
+        while operators:
+            _, token = operators.pop()
+            b = operands.pop()
+            operands[-1] = BinaryOperator(
+                op=binary_operator[token.kind][1],
+                left=operands[-1],
+                right=b,
+                location=token.location,
+            )
+        return operands[0]
+
+    @update_call_tree
+    def multiplicative_expression(self):
+        """
+        multiplicative-expression:
+            cast-expression
+            multiplicative-expression * cast-expression
+            multiplicative-expression / cast-expression
+            multiplicative-expression % cast-expression
+        """
+        return self.binary_expression(10)
 
     @update_call_tree
     def additive_expression(self):
@@ -561,28 +642,7 @@ class Parser:
             additive-expression + multiplicative-expression
             additive-expression - multiplicative-expression
         """
-        z = self.save()
-        a = self.multiplicative_expression()
-        if a == None:
-            self.restore(z)
-            return None
-        token_opkind = {
-            TokenKind.PLUS: BinOpKind.ADD,
-            TokenKind.MINUS: BinOpKind.SUB,
-        }
-        while self.curtoken().kind in token_opkind.keys():
-            token = self.curtoken()
-            if self.expect(token.kind) and (b := self.multiplicative_expression()):
-                a = BinaryOperator(
-                    op=token_opkind[token.kind],
-                    left=a,
-                    right=b,
-                    location=token.location,
-                )
-            else:
-                self.restore(z)
-                return None
-        return a
+        return self.binary_expression(9)
 
     @update_call_tree
     def shift_expression(self):
@@ -592,28 +652,7 @@ class Parser:
             shift-expression << additive-expression
             shift-expression >> additive-expression
         """
-        z = self.save()
-        a = self.additive_expression()
-        if a == None:
-            self.restore(z)
-            return None
-        token_opkind = {
-            TokenKind.LESSLESS: BinOpKind.LSHIFT,
-            TokenKind.GREATERGREATER: BinOpKind.RSHIFT,
-        }
-        while self.curtoken().kind in token_opkind.keys():
-            token = self.curtoken()
-            if self.expect(token.kind) and (b := self.additive_expression()):
-                a = BinaryOperator(
-                    op=token_opkind[token.kind],
-                    left=a,
-                    right=b,
-                    location=token.location,
-                )
-            else:
-                self.restore(z)
-                return None
-        return a
+        return self.binary_expression(8)
 
     @update_call_tree
     def relational_expression(self):
@@ -625,30 +664,7 @@ class Parser:
             relational-expression <= shift-expression
             relational-expression >= shift-expression
         """
-        z = self.save()
-        a = self.shift_expression()
-        if a == None:
-            self.restore(z)
-            return None
-        token_opkind = {
-            TokenKind.LESS: BinOpKind.LT,
-            TokenKind.GREATER: BinOpKind.GT,
-            TokenKind.LESSEQUAL: BinOpKind.LTE,
-            TokenKind.GREATEREQUAL: BinOpKind.GTE,
-        }
-        while self.curtoken().kind in token_opkind.keys():
-            token = self.curtoken()
-            if self.expect(token.kind) and (b := self.shift_expression()):
-                a = BinaryOperator(
-                    op=token_opkind[token.kind],
-                    left=a,
-                    right=b,
-                    location=token.location,
-                )
-            else:
-                self.restore(z)
-                return None
-        return a
+        return self.binary_expression(7)
 
     @update_call_tree
     def equality_expression(self):
@@ -658,28 +674,7 @@ class Parser:
             equality-expression == relational-expression
             equality-expression != relational-expression
         """
-        z = self.save()
-        a = self.relational_expression()
-        if a == None:
-            self.restore(z)
-            return None
-        token_opkind = {
-            TokenKind.EQUALEQUAL: BinOpKind.EQ,
-            TokenKind.EXCLAIMEQUAL: BinOpKind.NEQ,
-        }
-        while self.curtoken().kind in token_opkind.keys():
-            token = self.curtoken()
-            if self.expect(token.kind) and (b := self.relational_expression()):
-                a = BinaryOperator(
-                    op=token_opkind[token.kind],
-                    left=a,
-                    right=b,
-                    location=token.location,
-                )
-            else:
-                self.restore(z)
-                return None
-        return a
+        return self.binary_expression(6)
 
     @update_call_tree
     def AND_expression(self):
@@ -688,27 +683,7 @@ class Parser:
             equality-expression
             AND-expression & equality-expression
         """
-        z = self.save()
-        a = self.equality_expression()
-        if a == None:
-            self.restore(z)
-            return None
-        token_opkind = {
-            TokenKind.AMP: BinOpKind.BITAND,
-        }
-        while self.curtoken().kind in token_opkind.keys():
-            token = self.curtoken()
-            if self.expect(token.kind) and (b := self.equality_expression()):
-                a = BinaryOperator(
-                    op=token_opkind[token.kind],
-                    left=a,
-                    right=b,
-                    location=token.location,
-                )
-            else:
-                self.restore(z)
-                return None
-        return a
+        return self.binary_expression(5)
 
     @update_call_tree
     def exclusive_OR_expression(self):
@@ -717,27 +692,7 @@ class Parser:
             AND-expression
             exclusive-OR-expression ^ AND-expression
         """
-        z = self.save()
-        a = self.AND_expression()
-        if a == None:
-            self.restore(z)
-            return None
-        token_opkind = {
-            TokenKind.CARET: BinOpKind.BITXOR,
-        }
-        while self.curtoken().kind in token_opkind.keys():
-            token = self.curtoken()
-            if self.expect(token.kind) and (b := self.AND_expression()):
-                a = BinaryOperator(
-                    op=token_opkind[token.kind],
-                    left=a,
-                    right=b,
-                    location=token.location,
-                )
-            else:
-                self.restore(z)
-                return None
-        return a
+        return self.binary_expression(4)
 
     @update_call_tree
     def inclusive_OR_expression(self):
@@ -746,27 +701,7 @@ class Parser:
             exclusive-OR-expression
             inclusive-OR-expression | exclusive-OR-expression
         """
-        z = self.save()
-        a = self.exclusive_OR_expression()
-        if a == None:
-            self.restore(z)
-            return None
-        token_opkind = {
-            TokenKind.PIPE: BinOpKind.BITOR,
-        }
-        while self.curtoken().kind in token_opkind.keys():
-            token = self.curtoken()
-            if self.expect(token.kind) and (b := self.exclusive_OR_expression()):
-                a = BinaryOperator(
-                    op=token_opkind[token.kind],
-                    left=a,
-                    right=b,
-                    location=token.location,
-                )
-            else:
-                self.restore(z)
-                return None
-        return a
+        return self.binary_expression(3)
 
     @update_call_tree
     def logical_AND_expression(self):
@@ -775,27 +710,7 @@ class Parser:
             inclusive-OR-expression
             logical-AND-expression && inclusive-OR-expression
         """
-        z = self.save()
-        a = self.inclusive_OR_expression()
-        if a == None:
-            self.restore(z)
-            return None
-        token_opkind = {
-            TokenKind.AMPAMP: BinOpKind.AND,
-        }
-        while self.curtoken().kind in token_opkind.keys():
-            token = self.curtoken()
-            if self.expect(token.kind) and (b := self.inclusive_OR_expression()):
-                a = BinaryOperator(
-                    op=token_opkind[token.kind],
-                    left=a,
-                    right=b,
-                    location=token.location,
-                )
-            else:
-                self.restore(z)
-                return None
-        return a
+        return self.binary_expression(2)
 
     @update_call_tree
     def logical_OR_expression(self):
@@ -804,37 +719,21 @@ class Parser:
             logical-AND-expression
             logical-OR-expression || logical-AND-expression
         """
-        z = self.save()
-        a = self.logical_AND_expression()
-        if a == None:
-            self.restore(z)
-            return None
-        token_opkind = {
-            TokenKind.PIPEPIPE: BinOpKind.OR,
-        }
-        while self.curtoken().kind in token_opkind.keys():
-            token = self.curtoken()
-            if self.expect(token.kind) and (b := self.logical_AND_expression()):
-                a = BinaryOperator(
-                    op=token_opkind[token.kind],
-                    left=a,
-                    right=b,
-                    location=token.location,
-                )
-            else:
-                self.restore(z)
-                return None
-        return a
+        return self.binary_expression(1)
 
     @update_call_tree
-    def conditional_expression(self):
+    def conditional_expression(self, left: Node = None):
         """
         conditional-expression:
             logical-OR-expression
             logical-OR-expression ? expression : conditional-expression
+        left不为None时是已经解析好的第一个操作数
         """
         z = self.save()
-        a = self.logical_OR_expression()
+        if left != None:
+            a = self.binary_expression(left=left)
+        else:
+            a = self.binary_expression()
         if a == None:
             self.restore(z)
             return None
@@ -883,6 +782,7 @@ class Parser:
         if a := self.unary_expression():
             token = self.curtoken()
             if token.kind in assignment_operator.keys():
+                y = self.save()
                 if self.expect(token.kind) and (b := self.assignment_expression()):
                     return BinaryOperator(
                         op=assignment_operator[token.kind],
@@ -890,6 +790,13 @@ class Parser:
                         right=b,
                         location=token.location,
                     )
+                self.restore(y)
+            # cast-expression会先尝试unary-expression, 因此从a继续解析即可,
+            # 重新解析会使嵌套的括号的用时随层数指数增长
+            if b := self.conditional_expression(left=a):
+                return b
+            self.restore(z)
+            return None
         self.restore(z)
         if a := self.conditional_expression():
             return a
@@ -1637,11 +1544,7 @@ class Parser:
             if a == None:
                 return b
             # 将direct_declarator接到pointer后面
-            c = a
-            while c.declarator != None:
-                c = c.declarator
-            c.declarator = b
-            return a
+            return self.append_declarator(a, b)
         self.restore(z)
         return None
 
@@ -1945,11 +1848,7 @@ class Parser:
         if ((a := self.optional(self.pointer)),) and (
             b := self.direct_abstract_declarator()
         ):
-            c = b
-            while c.declarator != None:
-                c = c.declarator
-            c.declarator = a
-            return b
+            return self.append_declarator(b, a)
         self.restore(z)
         if a := self.pointer():
             return a
@@ -2089,22 +1988,19 @@ class Parser:
             { initializer-list , }
         """
         z = self.save()
+        if (a := self.expect(TokenKind.L_BRACE)) == None:
+            self.restore(z)
+            return None
+        # 各候选式共用开头的'{'以及initializer-list, 嵌套时不会重复解析
+        y = self.save()
         if (
-            self.expect(TokenKind.L_BRACE)
-            and (a := self.initializer_list()) != None
-            and self.expect(TokenKind.COMMA)
-            and self.expect(TokenKind.R_BRACE)
-        ):
-            return a
-        self.restore(z)
-        if (
-            self.expect(TokenKind.L_BRACE)
-            and (a := self.initializer_list()) != None
+            (b := self.initializer_list()) != None
+            and (self.optional(lambda: self.expect(TokenKind.COMMA)),)
             and self.expect(TokenKind.R_BRACE)
         ):
-            return a
-        self.restore(z)
-        if (a := self.expect(TokenKind.L_BRACE)) and self.expect(TokenKind.R_BRACE):
+            return b
+        self.restore(y)
+        if self.expect(TokenKind.R_BRACE):
             return InitList(initializers=[], location=a.location)
         self.restore(z)
         return None
@@ -2136,6 +2032,7 @@ class Parser:
         a = []
         b = self.designation()
         if b != None:
+            b = copy(b)
             b.initializer = self.initializer()
             if b.initializer == None:
                 self.restore(z)
@@ -2150,6 +2047,7 @@ class Parser:
         while self.curtoken().kind == TokenKind.COMMA:
             b = self.designation()
             if b != None:
+                b = copy(b)
                 b.initializer = self.initializer()
                 if b.initializer == None:
                     self.restore(z)
@@ -2338,6 +2236,7 @@ class Parser:
         z = self.save()
         b = self.attribute_argument_clause()
         if b != None:
+            a = copy(a)
             a.args = b
         else:
             self.restore(z)
@@ -2490,10 +2389,12 @@ class Parser:
         b = self.optional(self.attribute_specifier_sequence)
         z = self.save()
         if a := self.primary_block():
+            a = copy(a)
             a.attribute_specifiers = b
             return a
         self.restore(z)
         if a := self.jump_statement():
+            a = copy(a)
             a.attribute_specifiers = b
             return a
         self.restore(z)
@@ -2575,6 +2476,7 @@ class Parser:
         """
         z = self.save()
         if (a := self.label()) and (b := self.statement()):
+            a = copy(a)
             a.stmt = b
             return a
         self.restore(z)
@@ -2672,35 +2574,39 @@ class Parser:
             switch ( expression ) secondary-block
         """
         z = self.save()
-        if (
+        # else if组成的链在循环中解析, 而不是每个if递归一层
+        chain = []  # 依次为链上各个if的(if, 条件, 语句体, else之前的位置)
+        while (
             (a := self.expect(TokenKind.IF))
             and self.expect(TokenKind.L_PAREN)
             and (b := self.expression())
             and self.expect(TokenKind.R_PAREN)
             and (c := self.secondary_block())
-            and self.expect(TokenKind.ELSE)
-            and (d := self.secondary_block())
         ):
-            return IfStmt(
-                condition_expr=b,
-                body=c,
-                else_body=d,
-                location=a.location,
-            )
-        self.restore(z)
-        if (
-            (a := self.expect(TokenKind.IF))
-            and self.expect(TokenKind.L_PAREN)
-            and (b := self.expression())
-            and self.expect(TokenKind.R_PAREN)
-            and (c := self.secondary_block())
-        ):
-            return IfStmt(
-                condition_expr=b,
-                body=c,
-                else_body=None,
-                location=a.location,
-            )
+            chain.append((a, b, c, self.save()))
+            if not self.lookahead(TokenKind.ELSE, TokenKind.IF):
+                y = self.save()
+                if not (self.expect(TokenKind.ELSE) and (d := self.secondary_block())):
+                    self.restore(y)
+                    d = None
+                break
+            self.expect(TokenKind.ELSE)
+        else:
+            # 解析失败的else if不属于这条链, 与递归解析时一样, 上一个if没有else
+            if chain:
+                self.restore(chain[-1][3])
+            d = None
+        if chain:
+            for a, b, c, _ in reversed(chain):
+                if isinstance(d, IfStmt):
+                    d.attribute_specifiers = None  # 与作为secondary-block解析时相同
+                d = IfStmt(
+                    condition_expr=b,
+                    body=c,
+                    else_body=d,
+                    location=a.location,
+                )
+            return d
         self.restore(z)
         if (
             (a := self.expect(TokenKind.SWITCH))
@@ -2840,9 +2746,11 @@ class Parser:
             self.restore(z)
             return None
         a.append(b)
+        self.commit()
         z = self.save()
         while b := self.external_declaration():
             a.append(b)
+            self.commit()
             z = self.save()
         self.restore(z)
         return a
@@ -2890,6 +2798,7 @@ class Parser:
         self.restore(z)
         return None
 
+    @deep_recursion
     def start(self) -> Node:
         self.nexttoken()
 
@@ -2897,5 +2806,11 @@ class Parser:
         token = self.curtoken()
         if (a := self.translation_unit()) != None:
             return TranslationUnit(body=a, location=token.location)
-        self.restore(z)
+        self.restore(z)  # 同时撤销了type_symbol的变化
+        if not self.record_call_tree:
+            # 重新解析一遍, 得到生成诊断信息所需的调用树
+            self.record_call_tree = True
+            self.memo.clear()
+            self.translation_unit()
+            self.restore(z)
         return None
@@ -0,0 +1,136 @@
+import sys
+import time
+from typing import Optional
+from Parse.Parser import Parser
+from Parse.Wrapper import rule_names
+
+
+class RuleStat:
+    """一个Parser方法的统计结果"""
+
+    __slots__ = (
+        "calls",
+        "successes",
+        "failures",
+        "consumed",
+        "rewound",
+        "seconds",
+        "wasted",
+    )
+
+    def __init__(self):
+        self.calls = 0  # 调用次数
+        self.successes = 0  # 返回值不为None的次数
+        self.failures = 0  # 返回None的次数
+        self.consumed = 0  # 成功时消耗的token数
+        self.rewound = 0  # 该方法中直接调用restore()回退的token数
+        self.seconds = 0.0  # 累计用时(秒), 递归调用只计算最外层
+        self.wasted = 0.0  # 返回None的调用的累计用时(秒), 这部分工作全部被丢弃
+
+
+class RuleStats:
+    """
+    统计每个语法规则(被update_call_tree装饰的Parser方法)的调用情况
+
+    instrument之后所有Parser的规则方法以及restore都会被替换为进行统计的版本,
+    直到调用restore_methods, 因此不统计时没有额外开销
+    """
+
+    def __init__(self):
+        self.rules: dict[str, RuleStat] = {}
+        self.stack: list[RuleStat] = []  # 正在执行的规则, 用于统计回退的token
+        self.depth: dict[str, int] = {}  # 每个规则正在执行的层数
+        self.patched: list[tuple[str, object]] = []
+
+    def instrument(self):
+        for name in dict.fromkeys(rule_names):
+            self.patch(name, self.rule_wrapper(name, Parser.__dict__[name]))
+        self.patch("restore", self.restore_wrapper(Parser.__dict__["restore"]))
+
+    def patch(self, name: str, wrapper):
+        self.patched.append((name, Parser.__dict__[name]))
+        setattr(Parser, name, wrapper)
+
+    def restore_methods(self):
+        while self.patched:
+            name, method = self.patched.pop()
+            setattr(Parser, name, method)
+
+    def rule_wrapper(self, name: str, method):
+        stat = self.rules.setdefault(name, RuleStat())
+        stack, depth = self.stack, self.depth
+
+        def wrapper(parser: Parser, *args, **kwargs):
+            level = depth.get(name, 0)
+            depth[name] = level + 1
+            stack.append(stat)
+            begin = parser.tokengen.save()
+            start = time.perf_counter()
+            try:
+                ret = method(parser, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                stack.pop()
+                depth[name] = level
+            stat.calls += 1
+            if level == 0:
+                stat.seconds += elapsed
+            if ret == None:
+                stat.failures += 1
+                if level == 0:
+                    stat.wasted += elapsed
+            else:
+                stat.successes += 1
+                stat.consumed += parser.tokengen.save() - begin
+            return ret
+
+        return wrapper
+
+    def restore_wrapper(self, method):
+        stack = self.stack
+
+        def restore(parser: Parser, state):
+            rewound = parser.tokengen.save() - state[0]
+            if rewound > 0 and stack:
+                stack[-1].rewound += rewound
+            method(parser, state)
+
+        return restore
+
+    def to_dict(self) -> dict[str, dict]:
+        return {
+            name: {key: getattr(stat, key) for key in RuleStat.__slots__}
+            for name, stat in self.rules.items()
+            if stat.calls
+        }
+
+    def merge(self, rules: dict[str, dict]):
+        """合并另一个RuleStats.to_dict()的结果"""
+        for name, data in rules.items():
+            stat = self.rules.setdefault(name, RuleStat())
+            for key in RuleStat.__slots__:
+                setattr(stat, key, getattr(stat, key) + data[key])
+
+    def dump(self, limit: Optional[int] = None, file=None):
+        """按浪费的用时从多到少输出前limit个规则, 默认输出到标准错误"""
+        file = file if file != None else sys.stderr
+        rules = sorted(
+            ((name, stat) for name, stat in self.rules.items() if stat.calls),
+            key=lambda x: (x[1].wasted, x[1].rewound),
+            reverse=True,
+        )
+        if limit != None:
+            rules = rules[:limit]
+        print("===== 各语法规则的调用情况(按浪费的用时排序) =====", file=file)
+        print(
+            f"{'浪费(秒)':>8} {'用时(秒)':>8} {'调用':>8} {'成功':>8} {'失败':>8}"
+            f" {'消耗token':>9} {'回退token':>9}  规则",
+            file=file,
+        )
+        for name, stat in rules:
+            print(
+                f"{stat.wasted:12.4f} {stat.seconds:12.4f} {stat.calls:10}"
+                f" {stat.successes:10} {stat.failures:10}"
+                f" {stat.consumed:11} {stat.rewound:11}  {name}",
+                file=file,
+            )
@@ -24,8 +24,8 @@ def check_ast(node: Node, expected: Node):
             assert attr == val
 
 
-def get_parser(filename: str):
+def get_parser(filename: str, **kwargs):
     reader = FileReader(os.path.join(os.path.dirname(__file__), filename))
     lexer = Preprocessor(reader)
-    parser = Parser(lexer)
+    parser = Parser(lexer, **kwargs)
     return parser
@@ -0,0 +1,78 @@
+import json
+from argparse import Namespace
+from Common import *
+import Main
+
+
+def test_batch(tmp_path, capsys):
+    with open(tmp_path / "good.c", "w", encoding="utf-8") as file:
+        file.write("int a;\n")
+    with open(tmp_path / "bad.c", "wb") as file:
+        file.write(b"int \xff;\n")  # 不是UTF-8编码
+    manifest = str(tmp_path / "compile_commands.json")
+    with open(manifest, "w", encoding="utf-8") as file:
+        json.dump(
+            [
+                {"directory": str(tmp_path), "file": "bad.c", "command": "cc -Iinc"},
+                {"directory": str(tmp_path), "file": "good.c", "arguments": ["cc"]},
+            ],
+            file,
+        )
+    jobs = Main.read_manifest(manifest)
+    assert jobs == [
+        (str(tmp_path / "bad.c"), str(tmp_path), [str(tmp_path / "inc")]),
+        (str(tmp_path / "good.c"), str(tmp_path), []),
+    ]
+
+    args = Namespace(
+        dump_tokens=False,
+        dump_ast=True,
+        emit_pch=None,
+        include_pch=None,
+        parallel=False,
+        packrat=False,
+        jobs=2,
+        token_cache=None,
+        ftime_report=None,
+        rule_stats=None,
+        macro_stats=None,
+    )
+    Main.batch(jobs, args)
+    out, err = capsys.readouterr()
+    # 出错的文件只报告诊断信息, 不影响其他文件
+    assert "UnicodeDecodeError" in out
+    assert "TranslationUnit" in out
+    assert "1 个错误" in err and "good.c (成功)" in err
+
+
+def test_bounded_sources(tmp_path):
+    """批处理的工作进程保留的源文件内容不随文件数量增长"""
+    from Basic import Location, SourceCache
+
+    args = Namespace(
+        dump_tokens=False,
+        dump_ast=False,
+        emit_pch=None,
+        include_pch=None,
+        parallel=False,
+        packrat=False,
+        ftime_report=None,
+        rule_stats=None,
+        macro_stats=None,
+    )
+    capacity = SourceCache.capacity
+    files = len(Location.files)
+    try:
+        SourceCache.capacity = 4000
+        for i in range(20):
+            filename = str(tmp_path / f"{i}.c")
+            with open(filename, "w", encoding="utf-8") as file:
+                error = "int f() { return 1 }\n" if i % 2 else ""
+                file.write(error + f"int a{i};\n" * 100)
+            output, errors, _, _ = Main.run_job(filename, str(tmp_path), [], args)
+            assert (errors > 0) == (i % 2 == 1) and (not errors or "错误" in output)
+            retained = sum(len(source.text) for source in Location.files[files:])
+            assert retained == 0
+            assert SourceCache.size <= SourceCache.capacity
+    finally:
+        SourceCache.capacity = capacity
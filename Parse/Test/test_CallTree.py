@@ -0,0 +1,40 @@
+import pickle
+from Common import *
+from Parse import generate_diagnostic
+
+
+def test_no_call_tree():
+    expected = get_parser("translation_unit.txt").start()
+    parser = get_parser("translation_unit.txt", record_call_tree=False)
+    a = parser.start()
+    check_ast(a, expected)
+    assert parser.call_tree == None
+
+
+def test_diagnostic_reparse():
+    parser = get_parser("syntax_error.txt")
+    assert parser.start() == None
+    expected = generate_diagnostic(parser.call_tree)
+
+    for kwargs in ({}, {"packrat": True}):
+        parser = get_parser("syntax_error.txt", record_call_tree=False, **kwargs)
+        assert parser.start() == None
+        assert parser.call_tree != None
+        diagnostics = generate_diagnostic(parser.call_tree)
+        assert [i.msg for i in diagnostics.list] == [i.msg for i in expected.list]
+        assert [str(i.location) for i in diagnostics.list] == [
+            str(i.location) for i in expected.list
+        ]
+
+
+def test_diagnostic_pickle():
+    # 批处理时诊断信息需要从工作进程传回
+    parser = get_parser("syntax_error.txt")
+    assert parser.start() == None
+    expected = generate_diagnostic(parser.call_tree)
+    diagnostics = pickle.loads(pickle.dumps(expected))
+    assert [type(i) for i in diagnostics.list] == [type(i) for i in expected.list]
+    assert [i.msg for i in diagnostics.list] == [i.msg for i in expected.list]
+    assert [str(i.location) for i in diagnostics.list] == [
+        str(i.location) for i in expected.list
+    ]
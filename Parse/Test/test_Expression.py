@@ -148,6 +148,69 @@ def test_arithmetic_expression():
     assert parser.curtoken().kind == TokenKind.END
 
 
+def test_binary_expression():
+    parser = get_parser("binary_expression.txt")
+    parser.nexttoken()
+
+    def binop(op, left, right):
+        return BinaryOperator(op=op, left=left, right=right)
+
+    a, b, c, d, e, f, g, h, i, j, k = (Reference(name=x) for x in "abcdefghijk")
+    for expected in (
+        binop(
+            BinOpKind.OR,
+            a,
+            binop(
+                BinOpKind.AND,
+                b,
+                binop(
+                    BinOpKind.BITOR,
+                    c,
+                    binop(
+                        BinOpKind.BITXOR,
+                        d,
+                        binop(
+                            BinOpKind.BITAND,
+                            e,
+                            binop(
+                                BinOpKind.EQ,
+                                f,
+                                binop(
+                                    BinOpKind.LT,
+                                    g,
+                                    binop(
+                                        BinOpKind.LSHIFT,
+                                        h,
+                                        binop(
+                                            BinOpKind.ADD,
+                                            i,
+                                            binop(BinOpKind.MUL, j, k),
+                                        ),
+                                    ),
+                                ),
+                            ),
+                        ),
+                    ),
+                ),
+            ),
+        ),
+        binop(
+            BinOpKind.EQ,
+            binop(
+                BinOpKind.SUB, binop(BinOpKind.SUB, binop(BinOpKind.MUL, a, b), c), d
+            ),
+            e,
+        ),
+    ):
+        node = parser.logical_OR_expression()
+        node.accept(DumpVisitor())
+        check_ast(node, expected)
+    # 各层的方法只解析优先级不低于该层的运算符
+    node = parser.additive_expression()
+    check_ast(node, binop(BinOpKind.ADD, Reference(name="x"), Reference(name="y")))
+    assert parser.curtoken().kind == TokenKind.LESSLESS
+
+
 def test_conditional_expression():
     parser = get_parser("conditional_expression.txt")
     parser.nexttoken()
@@ -0,0 +1,73 @@
+import glob
+from Common import *
+from Parse.CallTree import CallTree, generate_diagnostic
+from Parse.FirstSet import first_sets
+
+sources = sorted(
+    os.path.basename(i)
+    for i in glob.glob(os.path.join(os.path.dirname(__file__), "*.txt"))
+)
+
+
+def check_first(node: CallTree):
+    method_name = node.name.split("#")[0]
+    # 以关键字参数传入已经解析好的部分时不从FIRST集合开始
+    if node.return_val != None and method_name in first_sets and not node.kwargs:
+        assert node.begin_token.kind in first_sets[method_name], node.name
+    for child in node.children:
+        check_first(child)
+
+
+def parse_fragments(parser: Parser) -> list[Node]:
+    """测试用例中有外部声明, 语句和表达式, 依次尝试直到全部分析完或者失败"""
+    parser.nexttoken()
+    result = []
+    while parser.curtoken().kind != TokenKind.END:
+        for method in (
+            parser.external_declaration,
+            parser.block_item,
+            parser.expression,
+        ):
+            z = parser.save()
+            node = method()
+            if parser.record_call_tree:
+                check_first(parser.call_tree)
+            if node != None:
+                result.append(node)
+                break
+            parser.restore(z)
+        else:
+            break
+    return result
+
+
+def messages(parser: Parser) -> list[tuple[str, str]]:
+    diagnostics = generate_diagnostic(parser.call_tree)
+    return [(i.msg, str(i.location)) for i in diagnostics.list]
+
+
+def test_first_set():
+    # 不剪枝时, 每个成功的调用开始时的token都应该在FIRST集合中
+    for filename in sources:
+        parse_fragments(get_parser(filename, prune=False))
+
+
+def test_prune():
+    for filename in sources:
+        expected = get_parser(filename, record_call_tree=False, prune=False)
+        parser = get_parser(filename, record_call_tree=False)
+        a = parse_fragments(expected)
+        b = parse_fragments(parser)
+        assert len(a) == len(b)
+        for i, j in zip(a, b):
+            check_ast(j, i)
+        assert parser.curtoken().location == expected.curtoken().location
+        assert parser.type_symbol == expected.type_symbol
+
+
+def test_prune_diagnostic():
+    # 失败后重新解析时记录调用树, 不剪枝, 诊断信息与不剪枝时相同
+    expected = get_parser("syntax_error.txt", record_call_tree=False, prune=False)
+    parser = get_parser("syntax_error.txt", record_call_tree=False)
+    assert expected.start() == None and parser.start() == None
+    assert messages(parser) == messages(expected)
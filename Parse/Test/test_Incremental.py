@@ -0,0 +1,78 @@
+import copy
+from Common import *
+from Parse import IncrementalParser
+
+
+def full_parse(filename: str, text: str):
+    return Parser(Preprocessor(FileReader(filename, text))).start()
+
+
+def edit(parser: IncrementalParser, old: str, new: str):
+    """将第一处old替换为new并重新分析"""
+    begin = parser.text.index(old)
+    return parser.reparse(begin, begin + len(old), new)
+
+
+def test_incremental():
+    filename = os.path.join(os.path.dirname(__file__), "translation_unit.txt")
+    with open(filename, encoding="utf-8") as file:
+        text = file.read()
+    parser = IncrementalParser(filename, text)
+    check_ast(parser.unit, full_parse(filename, text))
+    p = parser.unit.body[3]
+
+    for old, new in (
+        ("c += 1", "c += a * 2"),  # 修改函数体
+        ("int h()", "long k;\nint h()"),  # 插入外部声明
+        ("int g = 1;", ""),  # 删除外部声明
+        ("typedef int T;", "typedef  int T;"),  # 修改第一个外部声明
+        ("    return U;\n}", "    return U;\n}\nint m;"),  # 在末尾添加外部声明
+    ):
+        a = edit(parser, old, new)
+        check_ast(a, full_parse(filename, parser.text))
+    assert parser.full_parses == 1
+    assert any(i is p for i in parser.unit.body)  # 未受影响的节点被复用
+
+    # 新增类型名, 预处理指令以及注释没有闭合时需要完整分析
+    for old, new in (
+        ("long k;", "typedef long k;"),
+        ("int m;", "#define M 1\nint m;"),
+        ("long k;", "long k; /*"),
+    ):
+        a = edit(parser, old, new)
+        expected = full_parse(filename, parser.text)
+        if expected == None:
+            assert a == None and parser.diagnostics != None
+        else:
+            check_ast(a, expected)
+    assert parser.full_parses == 4
+
+
+def test_location_ownership():
+    """之前返回的语法树与新的语法树共享节点, 其中的位置总是对应当前的文本"""
+    filename = os.path.join(os.path.dirname(__file__), "translation_unit.txt")
+    with open(filename, encoding="utf-8") as file:
+        text = file.read()
+    parser = IncrementalParser(filename, text)
+    old = parser.unit
+    last = old.body[-1]
+    snapshot = list(last.location)  # 编辑前转换成行列的位置保持不变
+    begin = last.location.begin
+    a = edit(parser, "typedef int T;", "typedef int T;\n")
+    assert parser.full_parses == 1
+    assert a.body[-1] is last
+    assert old.body[-1].location.begin == begin + 1
+    assert copy.deepcopy(last).location is last.location
+    assert list(last.location)[0]["lineno"] == snapshot[0]["lineno"] + 1
+    check_ast(a, full_parse(filename, parser.text))
+
+
+def test_incremental_error():
+    filename = os.path.join(os.path.dirname(__file__), "translation_unit.txt")
+    with open(filename, encoding="utf-8") as file:
+        text = file.read()
+    parser = IncrementalParser(filename, text)
+    assert edit(parser, "int T;", "int T") == None
+    assert parser.diagnostics != None
+    a = edit(parser, "int T", "int T;")
+    check_ast(a, full_parse(filename, text))
@@ -0,0 +1,63 @@
+import shutil
+from Common import *
+from Parse import PCH
+from Basic import Error
+import pytest
+
+
+def test_pch(tmp_path):
+    header = get_parser("pch_header.txt")
+    pch_file = str(tmp_path / "header.pch")
+    PCH.create(header.tokengen, header, header.start()).save(pch_file)
+
+    pch = PCH.load(pch_file)
+    assert set(pch.macros) == {"N", "ADD"}
+    assert pch.type_symbol == ["T"]
+    parser = get_parser("pch_main.txt")
+    pch.apply(parser.tokengen, parser)
+    a = parser.start()
+    a.accept(DumpVisitor())
+    assert len(pch.body) == 2 and len(a.body) == 1
+    assert isinstance(a.body[0].specifiers[0], TypedefSpecifier)
+    initializer = a.body[0].declarators[0].initializer
+    assert isinstance(initializer, BinaryOperator)
+    assert initializer.left.value == "10"
+    assert str(initializer.left.location).startswith("<" + header.tokengen.filename)
+
+
+def test_pch_outdated(tmp_path):
+    filename = str(tmp_path / "header.txt")
+    shutil.copy(os.path.join(os.path.dirname(__file__), "pch_header.txt"), filename)
+    parser = Parser(Preprocessor(FileReader(filename)))
+    pch_file = str(tmp_path / "header.pch")
+    PCH.create(parser.tokengen, parser, parser.start()).save(pch_file)
+    PCH.load(pch_file)
+    with open(filename, "a") as file:
+        file.write("int h;\n")
+    with pytest.raises(Error):
+        PCH.load(pch_file)
+
+
+def test_pch_corrupt(tmp_path):
+    header = get_parser("pch_header.txt")
+    pch_file = str(tmp_path / "header.pch")
+    PCH.create(header.tokengen, header, header.start()).save(pch_file)
+    with open(pch_file, "rb") as file:
+        data = file.read()
+
+    bad_file = str(tmp_path / "bad.pch")
+    for content in (
+        data[:60],  # 被截断
+        data[: PCH.header.size],  # 只有文件头
+        data[:3],
+        PCH.header.pack(PCH.magic, PCH.version) + b"garbage",
+        PCH.header.pack(PCH.magic, PCH.version + 1) + data[PCH.header.size :],
+        b"CMMPCH\x01\x00" + data[PCH.header.size :],  # 旧版本
+        # 引用了不存在的类
+        PCH.header.pack(PCH.magic, PCH.version) + b"cAST\nNoSuchNode\n.",
+        PCH.header.pack(PCH.magic, PCH.version) + b"cno_such_module\nNode\n.",
+    ):
+        with open(bad_file, "wb") as file:
+            file.write(content)
+        with pytest.raises(Error):
+            PCH.load(bad_file)
@@ -0,0 +1,18 @@
+from Common import *
+
+
+def test_packrat():
+    expected = get_parser("translation_unit.txt").start()
+    parser = get_parser("translation_unit.txt", packrat=True)
+    a = parser.start()
+    a.accept(DumpVisitor())
+    check_ast(a, expected)
+    assert parser.curtoken().kind == TokenKind.END
+    assert parser.memo
+
+
+def test_packrat_type_symbol():
+    # 记忆的结果不能让作用域内的typedef泄漏出去
+    parser = get_parser("translation_unit.txt", packrat=True)
+    parser.start()
+    assert parser.type_symbol == ["T", "PT"]
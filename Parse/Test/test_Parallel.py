@@ -0,0 +1,82 @@
+import pickle
+from Common import *
+from Basic import Location
+from Parse import ParallelParser, RuleStats, generate_diagnostic
+from Parse.Parallel import dumps, loads, split_declarations
+import pytest
+
+
+def test_split_declarations():
+    parser = get_parser("translation_unit.txt")
+    lexer = parser.tokengen
+    tokens = [lexer.next()]
+    while tokens[-1].kind != TokenKind.END:
+        tokens.append(lexer.next())
+    chunks = split_declarations(tokens)
+    # typedef int T; typedef T *PT; int g = 1; int *p; int f(...){...} int h(){...}
+    assert len(chunks) == 6
+    assert [i[2] for i in chunks] == [True, True, False, False, False, False]
+    assert tokens[chunks[4][0]].text == "int" and tokens[chunks[4][1] - 1].text == "}"
+
+
+def test_parallel():
+    expected = get_parser("translation_unit.txt").start()
+    for packrat in (False, True):
+        parser = get_parser("translation_unit.txt")
+        parser = ParallelParser(parser.tokengen, packrat=packrat, jobs=2)
+        check_ast(parser.start(), expected)
+        assert parser.type_symbol == ["T", "PT"]
+
+
+def test_parallel_error():
+    parser = get_parser("syntax_error.txt")
+    assert parser.start() == None
+    expected = generate_diagnostic(parser.call_tree)
+
+    parser = ParallelParser(get_parser("syntax_error.txt").tokengen, jobs=2)
+    assert parser.start() == None
+    diagnostics = generate_diagnostic(parser.call_tree)
+    assert [i.msg for i in diagnostics.list] == [i.msg for i in expected.list]
+
+
+def test_parallel_rule_stats():
+    serial = RuleStats()
+    serial.instrument()
+    try:
+        get_parser("translation_unit.txt").start()
+    finally:
+        serial.restore_methods()
+
+    stats = RuleStats()
+    stats.instrument()
+    try:
+        parser = get_parser("translation_unit.txt")
+        parser = ParallelParser(parser.tokengen, jobs=2, rule_stats=stats)
+        parser.start()
+    finally:
+        stats.restore_methods()
+    # 工作进程中分析的函数定义也被统计
+    assert stats.rules["function_definition"].calls > 0
+    assert (
+        stats.rules["compound_statement"].successes
+        == serial.rules["compound_statement"].successes
+    )
+
+
+def test_location_pickle():
+    parser = get_parser("translation_unit.txt")
+    lexer = parser.tokengen
+    tokens = [lexer.next()]
+    while tokens[-1].kind != TokenKind.END:
+        tokens.append(lexer.next())
+    file_id = tokens[0].location.file_id
+    file_ids = {file_id: file_id}
+    data = dumps(tokens[:3], file_ids)
+    # 只有token本身的内容, 不包含源文件
+    assert Location.files[file_id].text not in str(data, "utf-8", "replace")
+    with pytest.raises(pickle.UnpicklingError):
+        pickle.loads(data)
+    result = loads(data, file_ids)
+    assert [i.text for i in result] == [i.text for i in tokens[:3]]
+    assert [i.location for i in result] == [i.location for i in tokens[:3]]
+    assert result[0].location.lineno == tokens[0].location.lineno
@@ -0,0 +1,94 @@
+import sys
+from Common import *
+from Parse import generate_diagnostic
+
+depth = 1000  # 每层都需要多个栈帧, 直接递归解析时会超过默认的最大递归深度
+
+
+def parse_text(text: str, **kwargs):
+    parser = Parser(Preprocessor(FileReader("deep.c", text)), **kwargs)
+    return parser.start()
+
+
+def test_nested_parentheses():
+    limit = sys.getrecursionlimit()
+    for record_call_tree in (True, False):
+        text = "int a = " + "(" * depth + "1" + ")" * depth + ";"
+        ast = parse_text(text, record_call_tree=record_call_tree)
+        check_ast(ast.body[0].declarators[0].initializer, IntegerLiteral(value="1"))
+    assert sys.getrecursionlimit() == limit  # 分析结束后恢复原来的设置
+
+
+def test_nested_initializer():
+    text = "int a = " + "{" * depth + "1" + "}" * depth + ";"
+    a = parse_text(text, record_call_tree=False).body[0].declarators[0].initializer
+    for _ in range(depth):
+        assert len(a) == 1
+        a = a[0]
+    check_ast(a, IntegerLiteral(value="1"))
+
+
+def test_else_if_chain():
+    text = (
+        "void f(int a)\n{\n    if (a == 0) a;\n"
+        + "".join(f"    else if (a == {i}) a;\n" for i in range(1, depth))
+        + "    else a;\n}\n"
+    )
+    a = parse_text(text, record_call_tree=False).body[0].body.items[0]
+    for i in range(depth):
+        assert isinstance(a, IfStmt)
+        check_ast(a.condition_expr.right, IntegerLiteral(value=str(i)))
+        a = a.else_body
+        if isinstance(a, IfStmt):
+            assert a.attribute_specifiers == None
+    assert isinstance(a, ExpressionStmt)
+
+
+def test_else_if_error():
+    # 出错的else if不属于这条链, 由外层报告错误, 诊断信息指向它
+    text = "void f(int a)\n{\n    if (a) a;\n    else if (a) a;\n    else if (a a;\n}\n"
+    parser = Parser(Preprocessor(FileReader("deep.c", text)), record_call_tree=False)
+    assert parser.start() == None
+    diagnostics = generate_diagnostic(parser.call_tree)
+    assert any(loc["lineno"] == 5 for i in diagnostics.list for loc in i.location)
+
+
+def test_concurrent_threads():
+    """先开始的调用先结束时, 不能恢复另一个线程仍在使用的最大递归深度"""
+    import threading
+    from Basic import Recursion
+
+    limit = sys.getrecursionlimit()
+    entered, finished = threading.Event(), threading.Event()
+    results = []
+
+    def deep():
+        entered.set()
+        finished.wait()
+        results.append(sys.getrecursionlimit())
+        text = "int a = " + "(" * depth + "1" + ")" * depth + ";"
+        results.append(parse_text(text, record_call_tree=False))
+
+    def short():
+        thread.start()
+        entered.wait()
+
+    thread = threading.Thread(target=Recursion.deep_recursion(deep))
+    Recursion.deep_recursion(short)()
+    finished.set()
+    thread.join()
+    assert results[0] >= Recursion.recursion_limit
+    assert results[1] != None
+    assert sys.getrecursionlimit() == limit
+
+
+def test_thread_fallback(monkeypatch):
+    from Basic import Recursion
+
+    def start_thread(run):
+        raise RuntimeError("can't start new thread")
+
+    monkeypatch.setattr(Recursion, "start_thread", start_thread)
+    limit = sys.getrecursionlimit()
+    assert parse_text("int a = (1);") != None
+    assert sys.getrecursionlimit() == limit
@@ -0,0 +1,35 @@
+import io
+from Common import *
+from Parse import RuleStats
+
+
+def test_rule_stats():
+    expect = Parser.expect
+    stats = RuleStats()
+    stats.instrument()
+    try:
+        parser = get_parser("translation_unit.txt")
+        parser.start()
+    finally:
+        stats.restore_methods()
+    assert Parser.expect is expect
+
+    rules = stats.rules
+    for stat in rules.values():
+        assert stat.calls == stat.successes + stat.failures
+        assert stat.wasted <= stat.seconds
+    # translation_unit消耗了END之前的全部token
+    tokens = parser.tokengen.tokens
+    assert rules["translation_unit"].successes == 1
+    assert rules["translation_unit"].consumed == len(tokens) - 1
+    assert rules["expect"].consumed == rules["expect"].successes
+    assert sum(stat.rewound for stat in rules.values()) > 0
+
+    output = io.StringIO()
+    stats.dump(3, output)
+    lines = output.getvalue().splitlines()
+    assert len(lines) == 2 + 3
+    merged = RuleStats()
+    merged.merge(stats.to_dict())
+    merged.merge(stats.to_dict())
+    assert merged.rules["expect"].calls == 2 * rules["expect"].calls
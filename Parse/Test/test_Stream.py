@@ -0,0 +1,14 @@
+from Common import *
+
+
+def test_stream():
+    expected = get_parser("translation_unit.txt").start()
+    for packrat in (False, True):
+        parser = get_parser("translation_unit.txt", packrat=packrat)
+        parser.tokengen.streaming = True
+        a = parser.start()
+        check_ast(a, expected)
+        assert parser.curtoken().kind == TokenKind.END
+        # 只保留了最后一个外部声明之后的token
+        assert parser.tokengen.base > 0
+        assert len(parser.tokengen.tokens) <= 3
@@ -0,0 +1,68 @@
+import io
+import json
+import time
+from contextlib import redirect_stdout
+from argparse import Namespace
+from Common import *
+from Basic import TimeReport
+from Basic.TimeReport import peak_rss
+import Main
+
+
+def test_nested_phase():
+    report = TimeReport()
+    with report.phase("outer"):
+        time.sleep(0.02)
+        for _ in range(3):
+            with report.phase("inner"):
+                time.sleep(0.01)
+    outer, inner = report.phases["outer"], report.phases["inner"]
+    assert (outer.calls, inner.calls) == (1, 3)
+    # 嵌套的阶段的用时只计入最内层
+    assert inner.seconds >= 0.03
+    assert 0.02 <= outer.seconds < inner.seconds
+
+
+def test_peak_rss_growth():
+    if peak_rss() == 0:  # 无法获取峰值内存
+        return
+    report = TimeReport()
+    with report.phase("outer"):
+        with report.phase("alloc"):
+            data = b"x" * (peak_rss() + 2**25)  # 一定超过之前的峰值
+        del data
+    # 峰值的增长只计入分配内存时所处的最内层阶段
+    assert report.phases["alloc"].rss >= 2**25
+    assert report.phases["outer"].rss == 0
+
+
+def test_compile_file():
+    args = Namespace(
+        dump_tokens=False,
+        dump_ast=True,
+        emit_pch=None,
+        include_pch=None,
+        parallel=False,
+        packrat=False,
+    )
+    filename = os.path.join(os.path.dirname(__file__), "translation_unit.txt")
+    report = TimeReport()
+    Main.instrument(report)
+    try:
+        with redirect_stdout(io.StringIO()):
+            Main.compile_file(filename, args, report)
+    finally:
+        report.restore()
+    assert "wrapper" not in Preprocessor.getNewToken.__code__.co_name
+    for name in ("读取文件", "预处理", "语法分析", "输出AST"):
+        assert report.phases[name].calls > 0
+    assert report.phases["语法分析"].calls == 1
+
+    output = io.StringIO()
+    report.dump("json", output)
+    phases = json.loads(output.getvalue())["phases"]
+    assert phases["语法分析"]["seconds"] == report.phases["语法分析"].seconds
+    merged = TimeReport()
+    merged.merge(phases)
+    merged.merge(phases)
+    assert merged.phases["预处理"].calls == 2 * report.phases["预处理"].calls
@@ -0,0 +1,30 @@
+from Common import *
+from Parse.TypeSymbol import TypeSymbolTable
+
+
+def test_type_symbol_table():
+    table = TypeSymbolTable(["T"])
+    assert "T" in table and "U" not in table
+    mark, state = table.mark(), table.state
+    table.add("U")
+    table.add("T")  # 内层作用域中重复的名字
+    assert table == ["T", "U", "T"]
+    changes = table.changes(mark)
+    table.rollback(mark)
+    assert table == ["T"] and "U" not in table and "T" in table
+    assert table.state == state
+    table.apply(changes)
+    assert table == ["T", "U", "T"] and table.state == changes[1]
+    table.rollback(0)
+    assert not table and table.state == 0
+
+
+def test_type_symbol_backtrack():
+    parser = get_parser("translation_unit.txt")
+    parser.nexttoken()
+    z = parser.save()
+    assert parser.external_declaration() != None
+    assert parser.type_symbol == ["T"]
+    parser.restore(z)  # 回溯时撤销添加的类型名
+    assert parser.type_symbol == [] and "T" not in parser.type_symbol
+    assert parser.curtoken().text == "typedef"
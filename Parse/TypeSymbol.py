@@ -0,0 +1,72 @@
+from itertools import count
+from typing import Iterable, Iterator
+
+states = count(1)  # 用于生成TypeSymbolTable.state
+
+
+class TypeSymbolTable:
+    """种类为类型的符号表
+
+    用字典记录每个名字被添加的次数, 查找是O(1)的
+    每次添加都按顺序记在trail中, 进入作用域或者保存状态时只需要记下trail的长度(mark),
+    离开作用域或者回溯时按相反的顺序撤销之后的添加(rollback)
+    state是当前内容的版本号, 内容不同时一定不同, 撤销之后恢复为添加之前的版本号
+    """
+
+    __slots__ = ("counts", "trail", "state")
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.counts: dict[str, int] = {}  # 名字被添加的次数
+        self.trail: list[tuple[str, int]] = []  # 按顺序添加的名字以及添加之前的版本号
+        self.state = 0
+        for name in names:
+            self.add(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.counts
+
+    def __iter__(self) -> Iterator[str]:
+        return (name for name, _ in self.trail)
+
+    def __len__(self) -> int:
+        return len(self.trail)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (TypeSymbolTable, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"TypeSymbolTable({list(self)})"
+
+    def add(self, name: str):
+        self.trail.append((name, self.state))
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.state = next(states)
+
+    def mark(self) -> int:
+        """返回当前的位置, 用于之后撤销"""
+        return len(self.trail)
+
+    def rollback(self, mark: int):
+        """撤销mark之后的所有添加"""
+        trail = self.trail
+        counts = self.counts
+        while len(trail) > mark:
+            name, self.state = trail.pop()
+            if counts[name] == 1:
+                del counts[name]
+            else:
+                counts[name] -= 1
+
+    def changes(self, mark: int) -> tuple[tuple[tuple[str, int], ...], int]:
+        """mark之后的添加以及当前的版本号, 可以用apply在相同的状态上重现"""
+        return tuple(self.trail[mark:]), self.state
+
+    def apply(self, changes: tuple[tuple[tuple[str, int], ...], int]):
+        """重现changes返回的添加, 版本号也与记录时相同"""
+        added, state = changes
+        for name, _ in added:
+            self.counts[name] = self.counts.get(name, 0) + 1
+        self.trail.extend(added)
+        self.state = state
@@ -6,10 +6,13 @@ from typing import TYPE_CHECKING, Callable
 from AST import Declaration, StorageClass, StorageClassSpecifier, NameDeclarator
 from Basic import Diagnostic, Error, Token
 from Parse.CallTree import CallTree
+from Parse.FirstSet import first_sets
 
 if TYPE_CHECKING:
     from Parse.Parser import Parser
 
+rule_names: list[str] = []  # 所有被update_call_tree装饰的方法名
+
 
 def may_update_type_symbol(parser_method):
     """该Parser方法的返回值可能能够用来更新Parser.type_symbol"""
@@ -30,7 +33,7 @@ def may_update_type_symbol(parser_method):
             a = i
             while a != None:
                 if isinstance(a, NameDeclarator):
-                    self.type_symbol.append(a.name)
+                    self.type_symbol.add(a.name)
                     break
                 a = a.declarator
         return node
@@ -42,22 +45,72 @@ def may_enter_scope(parser_method):
     """该Parser方法对应的语法结构可能会进入一个新的作用域"""
 
     def wrapper(self: "Parser", *args, **kwargs):
-        type_symbol = tuple(self.type_symbol)
+        mark = self.type_symbol.mark()
         ret = parser_method(self, *args, **kwargs)
-        self.type_symbol = list(type_symbol)
+        self.type_symbol.rollback(mark)  # 撤销作用域内添加的类型名
         return ret
 
     return wrapper
 
 
+def save_memo(
+    self: "Parser", key: tuple, mark: int, ret, children: list[CallTree]
+):
+    """记录一次调用的结果, mark是调用之前type_symbol的位置, 与replay_memo配合使用"""
+    changes = None
+    if self.type_symbol.state != key[2]:  # 只有发生变化时才需要保存
+        changes = self.type_symbol.changes(mark)
+    self.memo[key] = (ret, self.tokengen.save(), changes, children)
+
+
+def replay_memo(self: "Parser", entry: tuple):
+    """重现被记忆的调用对Parser的影响, 并返回调用的结果和调用树子节点"""
+    ret, end, changes, children = entry
+    self.tokengen.restore(end)
+    if changes != None:
+        self.type_symbol.apply(changes)
+    return ret, children
+
+
 def update_call_tree(parser_method: Callable):
-    """被装饰的方法调用时将会更新Parser的调用树"""
+    """
+    被装饰的方法调用时将会更新Parser的调用树
+    如果Parser开启了packrat模式, 还会记忆(方法, token索引, type_symbol状态)对应的结果
+    不记录调用树时, 当前token不在方法的FIRST集合中则直接返回None
+    """
     method_name = parser_method.__code__.co_name
+    rule_names.append(method_name)
+    first = first_sets.get(method_name)
     count = 1
 
     def wrapper(self: "Parser", *args, **kwargs):
         nonlocal count
 
+        if (
+            first != None
+            and self.prune
+            and not kwargs  # 以关键字参数传入已经解析好的部分时不从FIRST集合开始
+            and not self.record_call_tree  # 记录调用树时不剪枝, 诊断信息保持不变
+            and self.curtoken().kind not in first
+        ):
+            return None
+
+        # 带参数的方法(expect, optional等)本身开销很小, 不进行记忆
+        memoize = self.packrat and not args and not kwargs
+        entry = None
+        if memoize:
+            key = (method_name, self.tokengen.save(), self.type_symbol.state)
+            entry = self.memo.get(key)
+            mark = self.type_symbol.mark()
+
+        if not self.record_call_tree:  # 不记录调用树
+            if entry != None:
+                return replay_memo(self, entry)[0]
+            ret = parser_method(self, *args, **kwargs)
+            if memoize:
+                save_memo(self, key, mark, ret, None)
+            return ret
+
         name = f"{method_name}#{count}"
         count += 1
         parent = self.cur_call_tree
@@ -69,14 +122,21 @@ def update_call_tree(parser_method: Callable):
             node.depth = parent.depth + 1
             node.position = len(self.cur_call_tree.children)
             self.cur_call_tree.children.append(node)
-        self.cur_call_tree = node
 
         node.args = args
         node.kwargs = kwargs
+
+        if entry != None:
+            node.return_val, node.children = replay_memo(self, entry)
+            return node.return_val
+
+        self.cur_call_tree = node
         ret = parser_method(self, *args, **kwargs)
         node.return_val = ret
-
         self.cur_call_tree = parent
+
+        if memoize:
+            save_memo(self, key, mark, ret, node.children)
         return ret
 
     return wrapper
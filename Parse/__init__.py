@@ -1,2 +1,6 @@
 from Parse.Parser import Parser
 from Parse.CallTree import generate_diagnostic
+from Parse.PCH import PCH
+from Parse.Incremental import IncrementalParser
+from Parse.Parallel import ParallelParser
+from Parse.RuleStats import RuleStats